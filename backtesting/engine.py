@@ -1,6 +1,9 @@
 import pandas as pd,numpy as np,json,os
 from datetime import datetime
 from config import Config
+from strategy.alignment import AsOfFrames,bar_period
+from strategy import kernels
+from backtesting.signals import SIGNAL_COLS,TARGET_COLS,ACTIONABLE
 from utils.logger import setup_logger
 logger=setup_logger("Backtest")
 
@@ -35,6 +38,14 @@ class Trade:
         if risk>0:
             if s.direction=="long":s.r_multiple=(ep-s.entry_price)/risk
             else:s.r_multiple=(s.entry_price-ep)/risk
+    def resolve(s,high,low,index,start):
+        # update() over bars start.. in one kernel call; returns the exit bar or None if still open
+        j,hit,fav,adv=kernels.first_hit(high,low,start,s.entry_price,s.stop_loss,s.take_profit,s.direction=="long")
+        s.max_fav=max(s.max_fav,fav);s.max_adv=max(s.max_adv,adv)
+        if hit<0:return None
+        if hit==0:s._close(s.stop_loss,index[j],"stop_loss")
+        else:s._close(s.take_profit,index[j],"take_profit")
+        return j
     def force_close(s,p,t):
         if s.is_open:s._close(p,t,"end_of_data")
     def to_dict(s):
@@ -51,19 +62,34 @@ class BacktestEngine:
         s.strategy=strategy;s.ib=initial_balance;s.balance=initial_balance
         s.comm=commission;s.slip=slippage;s.config=Config()
         s.trades=[];s.ot=None;s.tc=0;s.eq=[];s.peak=initial_balance;s.mdd=0;s.mdd_pct=0
-    def run(s,df,htf=None,warmup=50,progress=True):
+    def run(s,df,htf=None,warmup=50,progress=True,window=None,htf_window=None,aux=None,fast=True):
+        # The strategy sees views of the last `window` entry / `htf_window` HTF candles
+        # (default BT_WINDOW / BT_HTF_WINDOW, the live fetch sizes; 0 = whole history).
+        # aux: more analyze() frames, e.g. {"direction_df":d,"sniper_df":sn} for the MTF path;
+        # HTF and aux candles are visible to a bar once they have closed.
+        # fast: settle each trade when it opens (Trade.resolve) instead of Trade.update per bar.
+        # The kill zone is rated at each bar's close time, as in signals().
         logger.info(f"Backtest: {len(df)} candles | ${s.ib:,.2f}")
         s.balance=s.ib;s.trades=[];s.ot=None;s.tc=0;s.eq=[]
         s.peak=s.ib;s.mdd=0;s.mdd_pct=0
         n=len(df);rp=max(n//20,1)
+        w=s.config.BT_WINDOW if window is None else window
+        hw=s.config.BT_HTF_WINDOW if htf_window is None else htf_window
+        al=AsOfFrames(df.index,{"htf_df":htf,**(aux or {})},hw);cl=df.index+bar_period(df.index)
+        hlc=[df[k].to_numpy(dtype=float) for k in ("high","low","close")] if fast else None
+        done=-1
         for i in range(warmup,n):
             if progress and i%rp==0:
                 logger.info(f"  {i/n*100:.0f}% | Trades:{len(s.trades)} | ${s.balance:,.2f}")
-            cc=df.iloc[i];ct=df.index[i]
-            ch=None
-            if htf is not None and len(htf)>0:
-                m=htf.index<=ct
-                if m.any():ch=htf[m].copy()
+            ct=df.index[i]
+            if i<done:continue
+            if i==done:
+                if s.ot:continue
+                if s.balance<s.ib*0.5:break
+                s._signal(df,i,w,warmup,al,ct,cl[i])
+                if s.ot:done=s._settle(i,hlc,df.index)
+                continue
+            cc=df.iloc[i]
             if s.ot and s.ot.is_open:
                 s.ot.update(cc)
                 if not s.ot.is_open:
@@ -81,27 +107,107 @@ class BacktestEngine:
             if dd>s.mdd:s.mdd=dd;s.mdd_pct=ddp
             if s.ot:continue
             if s.balance<s.ib*0.5:break
-            try:
-                cd=df.iloc[:i+1].copy()
-                if len(cd)<warmup:continue
-                a=s.strategy.analyze(cd,ch)
-                if a["signal"] in ["STRONG_BUY","BUY","STRONG_SELL","SELL"]:
-                    if a["entry"] and a["stop_loss"] and a["take_profit"]:
-                        s._open(a,ct)
-            except:continue
+            s._signal(df,i,w,warmup,al,ct,cl[i])
+            if s.ot and fast:done=s._settle(i,hlc,df.index)
         if s.ot and s.ot.is_open:
             s.ot.force_close(df["close"].iloc[-1],df.index[-1])
             s.ot.pnl-=abs(s.ot.pnl)*s.comm*2
             s.balance+=s.ot.pnl;s.trades.append(s.ot)
         return s._report(df)
-    def _open(s,a,t):
+    def signals(s,df,htf=None,warmup=50,progress=True,window=None,htf_window=None,aux=None,start=0,stop=None):
+        # Phase 1 of a two-phase backtest: strategy.analyze_series over every bar. The table (actionable
+        # signals only, SIGNAL_COLS + TARGET_COLS, indexed by bar time) does not depend on
+        # sizing, fills or R:R, so replay() can evaluate any number of those settings on it.
+        # start/stop: only bars in [start, stop), still analyzed with the history before them.
+        # analyze() output depends only on the window it is given (the structure trackers,
+        # indicator streams and caches check the candles before reusing state), so skipping
+        # the bars run() spends in a trade changes nothing: replay(signals()) == run().
+        n=len(df);rp=max(n//20,1)
+        w=s.config.BT_WINDOW if window is None else window
+        hw=s.config.BT_HTF_WINDOW if htf_window is None else htf_window
+        # Windows shorter than warmup never reach the strategy (as in run())
+        bars=range(max(warmup,start),n if stop is None else stop) if not w or w>=warmup else []
+        def prog(k,total):
+            if progress and bars[k-1]%rp==0:logger.info(f"  Signals {bars[k-1]/n*100:.0f}%")
+        tab=s.strategy.analyze_series(df,htf,bars,window=w,htf_window=hw,progress=prog,**(aux or {}))
+        cols=SIGNAL_COLS+TARGET_COLS
+        if tab.empty:return pd.DataFrame(columns=cols,index=df.index[:0])
+        ok=tab["signal"].isin(ACTIONABLE)
+        for k in ("entry","stop_loss","take_profit"):ok&=tab[k].notna()&(tab[k]!=0)
+        return tab.loc[ok,cols]
+    def replay(s,df,table,warmup=50,rr=None):
+        # Phase 2: sizing, fills and accounting over a signals() table; same report as run()
+        # for the same strategy, whatever RISK_PER_TRADE / LEVERAGE / commission / slippage.
+        # rr: re-derive every target at this RISK_REWARD_RATIO, exactly as the strategy would.
+        s.balance=s.ib;s.trades=[];s.ot=None;s.tc=0;s.eq=[]
+        s.peak=s.ib;s.mdd=0;s.mdd_pct=0
+        n=len(df);idx=df.index
+        hlc=[df[k].to_numpy(dtype=float) for k in ("high","low","close")]
+        last=warmup-1;free=warmup;stop=False
+        cols=[table[k].to_numpy() for k in SIGNAL_COLS]
+        if rr is not None and set(TARGET_COLS)<=set(table.columns):
+            base,risk=(table[k].to_numpy(dtype=float) for k in TARGET_COLS)
+            tp=np.round(np.where(cols[1]=="long",base+risk*rr,base-risk*rr),2)
+            cols[5]=np.where(np.isnan(tp),cols[5],tp)
+        for p,*row in zip(idx.get_indexer(table.index),*cols):
+            if p<free:continue
+            s._book(idx[last+1:p+1],np.full(p-last,float(s.balance)),np.full(p-last,float(s.balance)))
+            s._open(dict(zip(SIGNAL_COLS,row)),idx[p]);last=free=p
+            if not s.ot:free=p+1;continue
+            last=s._settle(p,hlc,idx);free=last if s.ot is None else n
+            if s.ot is None and s.balance<s.ib*0.5:stop=True;break
+        if not stop and s.ot is None and last<n-1:
+            s._book(idx[last+1:n],np.full(n-1-last,float(s.balance)),np.full(n-1-last,float(s.balance)))
+        if s.ot and s.ot.is_open:
+            s.ot.force_close(df["close"].iloc[-1],df.index[-1])
+            s.ot.pnl-=abs(s.ot.pnl)*s.comm*2
+            s.balance+=s.ot.pnl;s.trades.append(s.ot)
+        return s._report(df)
+    def _signal(s,df,i,w,warmup,al,ct,now=None):
+        try:
+            cd=df.iloc[max(0,i+1-w) if w else 0:i+1]
+            if len(cd)<warmup:return
+            a=s.strategy.analyze(cd,now=now,**al.at(i))
+            if a["signal"] in ACTIONABLE:
+                if a["entry"] and a["stop_loss"] and a["take_profit"]:
+                    s._open(a,ct)
+        except Exception as e:logger.error(f"Analyze {ct}: {e}")
+    def _settle(s,i,hlc,idx):
+        """
+        Fast path for a trade opened on bar i: find its exit with Trade.resolve and book the
+        equity of bars i+1..exit in bulk, exactly as the per-bar loop would. Returns the last
+        bar booked (the exit bar, or the last bar if the trade is still open at the end).
+        """
+        h,l,c=hlc;t=s.ot;n=len(c)
+        j=t.resolve(h,l,idx,i+1)
+        k=n if j is None else j
+        cl=c[i+1:k]
+        ur=(cl-t.entry_price)*t.size if t.direction=="long" else (t.entry_price-cl)*t.size
+        eqs=s.balance+ur;bals=np.full(len(eqs),s.balance)
+        if j is not None:
+            t.pnl-=abs(t.pnl)*s.comm*2;s.balance+=t.pnl
+            s.trades.append(t);s.ot=None
+            eqs=np.append(eqs,s.balance+0);bals=np.append(bals,s.balance)
+        end=k if j is not None else n-1
+        s._book(idx[i+1:end+1],eqs,bals)
+        return end
+    def _book(s,ts,eqs,bals):
+        # Vectorized version of the per-bar equity / peak / drawdown bookkeeping
+        if not len(eqs):return
+        s.eq.extend({"timestamp":t,"equity":e,"balance":b} for t,e,b in zip(ts,eqs.tolist(),bals.tolist()))
+        pk=np.maximum.accumulate(np.concatenate(([s.peak],eqs)))[1:]
+        dd=pk-eqs;k=int(dd.argmax())
+        if dd[k]>s.mdd:s.mdd=float(dd[k]);s.mdd_pct=float(dd[k]/pk[k]) if pk[k]>0 else 0
+        s.peak=float(pk[-1])
+    def _open(s,a,t,used=0):
+        # used: notional of other open trades (portfolio), taken off the margin this one may use
         e=a["entry"];sl=a["stop_loss"];tp=a["take_profit"];d=a["direction"]
         c=a.get("confidence",0.5)
         if d=="long":e*=(1+s.slip)
         else:e*=(1-s.slip)
         ra=s.balance*s.config.RISK_PER_TRADE*c;ru=abs(e-sl)
         if ru<=0:return
-        sz=min(ra/ru,(s.balance*s.config.LEVERAGE*0.95)/e)
+        sz=min(ra/ru,(s.balance*s.config.LEVERAGE*0.95-used)/e)
         if sz<=0:return
         s.tc+=1;s.ot=Trade(s.tc,d,e,sl,tp,sz,t,a["signal"],c)
     def _report(s,df):
@@ -0,0 +1,276 @@
+import os,shutil,tempfile,itertools,numpy as np,pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor,as_completed
+from config import Config
+from strategy.smart_money import SmartMoneyStrategy
+from backtesting.engine import BacktestEngine
+from backtesting.signals import SignalStore,REPLAY_PARAMS,signal_key,signal_params,store_path
+from utils.logger import setup_logger
+logger=setup_logger("Optimizer")
+COLS=["open","high","low","close","volume"]
+
+def score(s):
+    """Optimizer score of a report summary (higher is better)"""
+    sc=0
+    sc+=min(s["total_return_pct"],200)*0.25
+    sc+=s["win_rate"]*0.2
+    sc+=min(s["profit_factor"],5)*8*0.2
+    sc-=s["max_drawdown_pct"]*0.2
+    sc+=min(s["sharpe_ratio"],3)*10*0.15
+    if s["total_trades"]>=5:sc+=5
+    return round(sc,1)
+
+class SharedFrames:
+    """
+    OHLCV frames copied once into a shared-memory block. Workers attach() by name and get
+    read-only DataFrames over the block, so no candle data is pickled per task.
+    """
+    def __init__(s,frames):
+        s.layout={};size=0
+        for k,f in frames.items():
+            if f is None or not len(f):continue
+            s.layout[k]=(size,len(f),f.index.unit,f.index.name);size+=len(f)*8*(1+len(COLS))
+        s.shm=shared_memory.SharedMemory(create=True,size=max(size,1))
+        for k,(off,n,_,_) in s.layout.items():
+            np.ndarray(n,np.int64,s.shm.buf,off)[:]=frames[k].index.asi8
+            np.ndarray((n,len(COLS)),float,s.shm.buf,off+n*8)[:]=frames[k][COLS].to_numpy(dtype=float)
+    def spec(s):return s.shm.name,s.layout
+    def close(s):s.shm.close();s.shm.unlink()
+    @staticmethod
+    def attach(spec):
+        name,layout=spec;shm=shared_memory.SharedMemory(name=name);frames={}
+        for k,(off,n,unit,iname) in layout.items():
+            ts=np.ndarray(n,np.int64,shm.buf,off).view(f"datetime64[{unit}]")
+            data=np.ndarray((n,len(COLS)),float,shm.buf,off+n*8);data.flags.writeable=False
+            frames[k]=pd.DataFrame(data,index=pd.DatetimeIndex(ts,name=iname),columns=COLS,copy=False)
+        return shm,frames
+
+# Per-process state: the shared frames + signal store directory (set by _init in workers, directly when serial)
+_W={}
+
+def _init(spec,store):
+    shm,frames=SharedFrames.attach(spec);_W.clear();_W.update(frames,shm=shm,store=store)
+
+def _config(params):
+    cfg=Config()
+    for k,v in params.items():setattr(cfg,k,v)
+    return cfg
+
+def _err(e):return f"{type(e).__name__}: {e}"
+
+def _signal_table(cfg,meta,start=0,prev=None,extra=()):
+    """
+    Signal table of cfg's group for bars >= start, from the store if present. With prev (a
+    later start whose table is stored) only the bars in [start, prev) are analyzed. extra:
+    the group's own parameter names (keyed even when outside SIGNAL_PARAMS).
+    """
+    df,htf=_W["df"],_W.get("htf");store=SignalStore(_W["store"]);ps=signal_params(cfg,extra)
+    key=lambda st:signal_key(df,ps,htf,start=str(df.index[st]) if st else None,**meta)
+    def build():
+        en=BacktestEngine(SmartMoneyStrategy(cfg))
+        old=store.load(key(prev)) if prev is not None else None
+        if old is None:return en.signals(df,htf,progress=False,start=start)
+        return pd.concat([en.signals(df,htf,progress=False,start=start,stop=prev),old])
+    return store.get(key(start),build)
+
+def _replay(combos,tab,score_fn,start=0,stop=None):
+    """Replay every combo on bars [start, stop) of tab; start > 0 skips the warmup (history is in tab)"""
+    df=_W["df"];stop=len(df) if stop is None else stop
+    if start or stop<len(df):
+        df=df.iloc[start:stop];tab=tab[(tab.index>=df.index[0])&(tab.index<=df.index[-1])]
+    out=[]
+    for p in combos:
+        try:
+            en=BacktestEngine(None);en.config=_config(p);r=en.replay(df,tab,0 if start else 50,rr=en.config.RISK_REWARD_RATIO)
+            if "error" in r:out.append((p,{"error":r["error"]}));continue
+            out.append((p,dict(r["summary"],score=score_fn(r["summary"]))))
+        except Exception as e:out.append((p,{"error":_err(e),"failed":True}))
+    return out
+
+def _evaluate(combos,meta,score_fn=score,start=0,prev=None):
+    """
+    One signal group: build (or load) its signal table once, replay every combo against it.
+    start > 0 evaluates on the bars from start on only (the history before is still analyzed).
+    """
+    try:tab=_signal_table(_config(combos[0]),meta,start,prev,list(combos[0]))
+    except Exception as e:return [(p,{"error":_err(e),"failed":True}) for p in combos]
+    return _replay(combos,tab,score_fn,start)
+
+def _evaluate_folds(combos,meta,score_fn,windows):
+    """_evaluate on several [start, stop) windows off one full-history table; results tagged "fold" """
+    try:tab=_signal_table(_config(combos[0]),meta,extra=list(combos[0]))
+    except Exception as e:return [(p,{"error":_err(e),"failed":True}) for p in combos]
+    return [(p,dict(r,fold=k)) for k,(a,b) in enumerate(windows) for p,r in _replay(combos,tab,score_fn,a,b)]
+
+def _groups(combos):
+    """Combos that differ only in REPLAY_PARAMS share a signal table: one task per group"""
+    groups={}
+    for p in combos:groups.setdefault(tuple((k,v) for k,v in p.items() if k not in REPLAY_PARAMS),[]).append(p)
+    return list(groups.values())
+
+class _Runner:
+    """
+    Runs _evaluate tasks in this process (workers<=1) or on a pool attached to SharedFrames.
+    Signal tables go to SignalStore's directory when cache (default Config.SIGNAL_CACHE) is
+    on, else to a temporary one removed on exit (rungs and folds still reload them).
+    """
+    def __init__(s,df,htf,workers,cache=None):
+        s.workers=workers or os.cpu_count() or 1;s.df=df;s.htf=htf;s.sf=s.ex=None
+        s.store=store_path(cache);s.tmp=None
+    def __enter__(s):
+        if not s.store:s.tmp=s.store=tempfile.mkdtemp(prefix="signals_")
+        _W.clear();_W.update(df=s.df,htf=s.htf,store=s.store)
+        if s.workers>1:
+            s.sf=SharedFrames({"df":s.df,"htf":s.htf})
+            s.ex=ProcessPoolExecutor(s.workers,initializer=_init,initargs=(s.sf.spec(),s.store))
+        return s
+    def __exit__(s,*a):
+        if s.ex:s.ex.shutdown();s.sf.close()
+        if s.tmp:shutil.rmtree(s.tmp,ignore_errors=True);s.store=s.tmp=None
+        _W.clear()
+    def run(s,groups,*args,fn=_evaluate):
+        """Yield each group's fn(group, *args) as it finishes"""
+        if not s.ex or len(groups)<=1:
+            for g in groups:yield fn(g,*args)
+            return
+        fs={s.ex.submit(fn,g,*args):g for g in groups}
+        for f in as_completed(fs):
+            try:yield f.result()
+            except Exception as e:yield [(p,{"error":_err(e),"failed":True}) for p in fs[f]]
+
+class _Tally:
+    """Collects _evaluate output into result rows / failures, reporting progress"""
+    def __init__(s,order,total,progress):
+        s.order=order;s.total=total;s.progress=progress;s.done=0;s.results=[];s.failures=[]
+    def add(s,out):
+        for p,r in out:
+            s.done+=1
+            if r.get("failed"):s.failures.append({"params":p,"error":r["error"]});continue
+            if "error" in r:continue
+            s.results.append({"params":p,"score":r["score"],"ret":r["total_return_pct"],"wr":r["win_rate"],
+                "pf":r["profit_factor"],"dd":r["max_drawdown_pct"],"sh":r["sharpe_ratio"],
+                "trades":r["total_trades"],"i":s.order[tuple(p.items())]})
+        if s.progress:s.progress(s.done,s.total,max((r["score"] for r in s.results),default=None))
+    def ranked(s):
+        res=sorted(s.results,key=lambda r:(-r["score"],r["i"]))
+        for r in res:r.pop("i")
+        return res
+
+def _combos(grid):
+    keys=list(grid);combos=[dict(zip(keys,c)) for c in itertools.product(*grid.values())]
+    return combos,{tuple(p.items()):i for i,p in enumerate(combos)}
+
+def _meta(htf,meta):
+    return dict(meta or {},htf_end=str(htf.index[-1]) if htf is not None and len(htf) else None)
+
+def grid_search(df,htf,grid,workers=None,meta=None,progress=None,score_fn=score,cache=None):
+    """
+    Evaluate every combination of `grid` ({param: [values]}). Combos that differ only in
+    REPLAY_PARAMS form one group: its signal table is computed once and every combo in it
+    is a cheap replay. Groups run on `workers` processes (default: all cores, 1 = in this
+    process); progress(done, total, best) is called as they finish. score_fn maps a report
+    summary to a score (module-level function when workers > 1). Returns (results,
+    failures): results as {"params","score","ret",...} best first, failures as
+    {"params","error"} for combos that raised. cache keeps the signal tables in SignalStore
+    (default Config.SIGNAL_CACHE).
+    """
+    combos,order=_combos(grid);t=_Tally(order,len(combos),progress)
+    with _Runner(df,htf,workers,cache) as rn:
+        for out in rn.run(_groups(combos),_meta(htf,meta),score_fn):t.add(out)
+    return t.ranked(),t.failures
+
+def _propose(grid,seen,pool,k,rng):
+    """k configs of pool to try next: best predicted by a random forest fit on seen [(params, score)]"""
+    try:from sklearn.ensemble import RandomForestRegressor
+    except ImportError:return [pool[i] for i in rng.choice(len(pool),k,replace=False)]
+    enc=lambda p:[v if isinstance(v,(int,float)) else grid[k].index(v) for k,v in p.items()]
+    m=RandomForestRegressor(n_estimators=100,random_state=0).fit([enc(p) for p,_ in seen],[y for _,y in seen])
+    pred=m.predict([enc(p) for p in pool])
+    return [pool[i] for i in np.argsort(-pred,kind="stable")[:k]]
+
+def halving_search(df,htf,grid,workers=None,meta=None,progress=None,score_fn=score,eta=3,
+                   min_bars=300,max_configs=None,surrogate=False,seed=0,cache=None):
+    """
+    Successive halving over `grid`. Every config is scored on the most recent 1/eta^R of the
+    data, the best 1/eta of them on eta times as much, and so on until the survivors run on
+    the full history (R: as many rungs as keep the shortest slice >= min_bars). A rung only
+    analyzes the bars the previous one did not, since signal tables are extended backwards.
+
+    max_configs caps the first rung for grids too large to try exhaustively: a random half
+    is tried, then (surrogate=True, needs scikit-learn) the configs a random forest fit on
+    those scores predicts best, else another random sample. Returns (results, failures)
+    like grid_search, results being the last rung's (full history); cache as in grid_search.
+    """
+    combos,order=_combos(grid);rng=np.random.default_rng(seed);n=len(df);meta=_meta(htf,meta)
+    rungs=0
+    while n/eta**(rungs+1)>=min_bars and eta**(rungs+1)<len(combos):rungs+=1
+    starts=[n-int(np.ceil(n/eta**(rungs-r))) if r<rungs else 0 for r in range(rungs+1)]
+    failures=[];prev=None
+    with _Runner(df,htf,workers,cache) as rn:
+        def rung(cands,r):
+            t=_Tally(order,len(cands),progress)
+            for out in rn.run(_groups(cands),meta,score_fn,starts[r],prev):t.add(out)
+            failures.extend(t.failures)
+            logger.info(f"Rung {r+1}/{rungs+1}: {len(cands)} configs on {n-starts[r]} bars | best {max((x['score'] for x in t.results),default=0):.1f}")
+            return t.ranked()
+        cands=combos
+        if max_configs and len(combos)>max_configs:
+            first=[combos[i] for i in rng.choice(len(combos),max_configs//2,replace=False)]
+            res=rung(first,0);seen={tuple(p.items()) for p in first}
+            pool=[p for p in combos if tuple(p.items()) not in seen]
+            k=min(max_configs-len(first),len(pool))
+            if surrogate and len(res)>=2:more=_propose(grid,[(x["params"],x["score"]) for x in res],pool,k,rng)
+            else:more=[pool[i] for i in rng.choice(len(pool),k,replace=False)]
+            res=sorted(res+rung(more,0),key=lambda x:(-x["score"],order[tuple(x["params"].items())]))
+        else:res=rung(cands,0)
+        for r in range(1,rungs+1):
+            prev=starts[r-1]
+            res=rung([x["params"] for x in res[:max(1,int(np.ceil(len(res)/eta)))]],r)
+    return res,failures
+
+def fold_sizes(n,folds,train_ratio):
+    """(train_bars, test_bars) for `folds` test windows after a first train window train_ratio x as long, over n bars"""
+    if folds<1 or train_ratio<=0:raise ValueError(f"walk-forward needs folds >= 1 and train_ratio > 0, got {folds}, {train_ratio}")
+    test=int(n//(folds+train_ratio));train=int(test*train_ratio)
+    if test<1 or train<1:raise ValueError(f"{n} bars are too few for {folds} folds at train_ratio {train_ratio}")
+    return train,test
+
+def walk_forward(df,htf,grid,train_bars,test_bars,workers=None,meta=None,progress=None,score_fn=score,cache=None):
+    """
+    Rolling walk-forward: fold k optimizes `grid` on bars [k*test_bars, +train_bars) and
+    trades the winner on the test_bars after it. All folds come from one parallel pass:
+    each signal group builds (or loads) one full-history table and replays every combo on
+    every train window. The test windows are then replayed in order, each starting from
+    the balance the previous one ended with. Returns {"folds": [{"train","test" (time ranges),
+    "params","train_score","summary" (test)}], "report": stitched out-of-sample report,
+    "failures"}. cache as in grid_search.
+    """
+    n=len(df);wins=[]
+    if train_bars<1 or test_bars<1:raise ValueError(f"walk-forward needs train_bars and test_bars >= 1, got {train_bars}, {test_bars}")
+    while len(wins)*test_bars+train_bars+test_bars<=n:
+        a=len(wins)*test_bars;wins.append((a,a+train_bars,a+train_bars+test_bars))
+    if not wins:raise ValueError(f"walk-forward needs train_bars + test_bars <= {n}")
+    combos,order=_combos(grid);meta=_meta(htf,meta);groups=_groups(combos)
+    tallies=[_Tally(order,len(combos),None) for _ in wins];failures=[]
+    with _Runner(df,htf,workers,cache) as rn:
+        for d,out in enumerate(rn.run(groups,meta,score_fn,[(a,b) for a,b,_ in wins],fn=_evaluate_folds),1):
+            for p,r in out:
+                if "fold" in r:tallies[r.pop("fold")].add([(p,r)])
+                else:failures.append({"params":p,"error":r["error"]})
+            if progress:progress(d,len(groups),max((x["score"] for t in tallies for x in t.results),default=None))
+        init=BacktestEngine(None).ib;bal=init;folds=[];trades=[];eq=[]
+        for (a,b,c),t in zip(wins,tallies):
+            failures.extend(f for f in t.failures if f not in failures)
+            f={"train":(str(df.index[a]),str(df.index[b-1])),"test":(str(df.index[b]),str(df.index[c-1])),
+               "params":None,"train_score":None,"summary":{"error":"No train results"}}
+            res=t.ranked();folds.append(f)
+            if not res:continue
+            f["params"]=res[0]["params"];f["train_score"]=res[0]["score"]
+            en=BacktestEngine(None,bal);en.config=_config(f["params"])
+            tab=_signal_table(en.config,meta,extra=list(f["params"]))
+            r=en.replay(df.iloc[b:c],tab[(tab.index>=df.index[b])&(tab.index<=df.index[c-1])],0,rr=en.config.RISK_REWARD_RATIO)
+            f["summary"]=r.get("summary",r);bal=en.balance;trades+=en.trades;eq+=en.eq
+    oos=BacktestEngine(None,init);oos.balance=bal;oos.trades=trades
+    for i,tr in enumerate(trades,1):tr.id=i
+    if eq:oos._book([e["timestamp"] for e in eq],np.array([e["equity"] for e in eq]),np.array([e["balance"] for e in eq]))
+    return {"folds":folds,"report":oos._report(df.iloc[wins[0][1]:wins[-1][2]]),"failures":failures}
@@ -0,0 +1,125 @@
+import os,heapq,numpy as np,pandas as pd
+from concurrent.futures import ProcessPoolExecutor,as_completed
+from config import Config
+from strategy.smart_money import SmartMoneyStrategy
+from backtesting.engine import BacktestEngine
+from backtesting.optimizer import SharedFrames
+from backtesting.signals import SignalStore,SIGNAL_COLS,signal_key,signal_params,store_path
+from utils.logger import setup_logger
+logger=setup_logger("Portfolio")
+
+# Per-process candles: {symbol: (df, htf)} + signal store directory (set by _init in workers)
+_P={}
+
+def _init(spec,symbols,store):
+    shm,frames=SharedFrames.attach(spec);_P.clear()
+    _P.update({k:(frames[f"{k}|df"],frames.get(f"{k}|htf")) for k in symbols},shm=shm,store=store)
+
+def _table(sym,meta,warmup):
+    """Signal table of one symbol (from the SignalStore when persisted), from the candles in _P"""
+    df,htf=_P[sym];cfg=Config()
+    key=signal_key(df,signal_params(cfg),htf,symbol=sym,warmup=warmup,
+        htf_end=str(htf.index[-1]) if htf is not None and len(htf) else None,**meta)
+    return sym,SignalStore(_P.get("store")).get(key,lambda:BacktestEngine(SmartMoneyStrategy(cfg)).signals(df,htf,warmup,progress=False))
+
+class PortfolioEngine:
+    """
+    Basket backtest: one signal table per symbol (generated on a process pool), merged into
+    a single time-ordered stream traded against one balance. At most MAX_OPEN_TRADES trades
+    are open at once and one per symbol. Sizing, fills and exits are BacktestEngine's, with
+    the margin cap shared: a trade's notional is limited to balance x LEVERAGE x 0.95 less
+    the notional already open, so total exposure stays within it. A one-symbol portfolio
+    reports exactly what BacktestEngine.replay does.
+    """
+    def __init__(s,initial_balance=10000,commission=0.0006,slippage=0.0002,max_open=None):
+        s.ib=initial_balance;s.comm=commission;s.slip=slippage;s.config=Config()
+        s.max_open=s.config.MAX_OPEN_TRADES if max_open is None else max_open
+    def run(s,data,warmup=50,workers=None,meta=None,cache=None):
+        # data: {symbol: (df, htf or None)}
+        return s.replay(data,s.signals(data,warmup,workers,meta,cache),warmup)
+    def signals(s,data,warmup=50,workers=None,meta=None,cache=None):
+        """
+        {symbol: signal table}, one symbol per worker process (default: all cores, 1 = here).
+        cache keeps the tables in SignalStore (default Config.SIGNAL_CACHE).
+        """
+        workers=min(workers or os.cpu_count() or 1,len(data));meta=meta or {};out={};store=store_path(cache)
+        logger.info(f"Signals: {len(data)} symbols on {workers} worker(s)")
+        if workers<=1:
+            _P.clear();_P.update(data,store=store)
+            try:
+                for k in data:out[k]=_table(k,meta,warmup)[1]
+            finally:_P.clear()
+            return out
+        sf=SharedFrames({f"{k}|{n}":f for k,(df,htf) in data.items() for n,f in (("df",df),("htf",htf))})
+        try:
+            with ProcessPoolExecutor(workers,initializer=_init,initargs=(sf.spec(),list(data),store)) as ex:
+                for f in as_completed([ex.submit(_table,k,meta,warmup) for k in data]):
+                    k,t=f.result();out[k]=t;logger.info(f"  {k}: {len(t)} signals")
+        finally:sf.close()
+        return {k:out[k] for k in data}
+    def replay(s,data,tables,warmup=50):
+        """
+        Trade the merged signal stream; same report as BacktestEngine plus "symbols",
+        "skipped" (signals over the open-trade limit) and "no_margin" (signals with no margin left)
+        """
+        en=BacktestEngine(None,s.ib,s.comm,s.slip);en.config=s.config
+        syms=list(data);ev=[];mk={}
+        for o,k in enumerate(syms):
+            df=data[k][0];tab=tables[k]
+            mk[k]=([df[c].to_numpy(dtype=float) for c in ("high","low","close")],df.index)
+            pos=df.index.get_indexer(tab.index);cols=[tab[c].to_numpy() for c in SIGNAL_COLS]
+            ev+=[(df.index[p],o,p,row) for p,*row in zip(pos,*cols) if p>=warmup]
+        ev.sort(key=lambda e:(e[0],e[1]))
+        # exits: heap of (exit time, trade id, symbol, trade, exit bar or None = open at the end)
+        exits=[];free={k:0 for k in syms};hist=[];open_end=[];skipped=nomargin=0;stop=False
+        def close(until):
+            while exits and (until is None or exits[0][0]<=until):
+                _,_,k,t,j=heapq.heappop(exits)
+                if j is None:(h,l,c),idx=mk[k];t.force_close(c[-1],idx[-1]);open_end.append(t.id)
+                t.pnl-=abs(t.pnl)*s.comm*2;en.balance+=t.pnl;en.trades.append(t)
+                if j is not None:hist.append((t.exit_time,en.balance))
+        for ts,o,p,row in ev:
+            close(ts);k=syms[o]
+            if en.balance<s.ib*0.5:stop=True
+            if stop:break
+            if p<free[k]:continue
+            if len(exits)>=s.max_open:skipped+=1;continue
+            used=sum(x[3].entry_price*x[3].size for x in exits)
+            if used>=en.balance*s.config.LEVERAGE*0.95:nomargin+=1;continue
+            en._open(dict(zip(SIGNAL_COLS,row)),ts,used)
+            if not en.ot:continue
+            t=en.ot;en.ot=None;t.symbol=k
+            (h,l,c),idx=mk[k];j=t.resolve(h,l,idx,p+1)
+            free[k]=len(idx) if j is None else j
+            heapq.heappush(exits,(pd.Timestamp.max if j is None else idx[j],t.id,k,t,j))
+        close(None)
+        return s._report(en,data,warmup,hist,open_end,skipped,nomargin)
+    def _report(s,en,data,warmup,hist,open_end,skipped,nomargin=0):
+        # Portfolio equity on the union of all bar times: realized balance + open trades
+        # marked at their symbol's last close, booked through BacktestEngine._book
+        ix=data[next(iter(data))][0].index
+        for df,_ in list(data.values())[1:]:ix=ix.union(df.index)
+        bal=np.full(len(ix),float(s.ib))
+        if hist:
+            hv=np.array([b for _,b in hist]);at=np.searchsorted(pd.DatetimeIndex([t for t,_ in hist]),ix,side="right")
+            bal=np.where(at>0,hv[np.maximum(at-1,0)],bal)
+        ur=np.zeros(len(ix));cls={k:df["close"].reindex(ix,method="ffill").to_numpy(dtype=float) for k,(df,_) in data.items()}
+        for t in en.trades:
+            cl=cls[t.symbol]
+            a=ix.searchsorted(t.entry_time,side="right")
+            b=len(ix) if t.id in open_end else ix.searchsorted(t.exit_time,side="left")
+            ur[a:b]+=(cl[a:b]-t.entry_price)*t.size if t.direction=="long" else (t.entry_price-cl[a:b])*t.size
+        st=ix.searchsorted(min(df.index[min(warmup,len(df)-1)] for df,_ in data.values()))
+        en._book(ix[st:],bal[st:]+ur[st:],bal[st:])
+        r=en._report(pd.DataFrame(index=ix))
+        if "error" in r:return r
+        for d,t in zip(r["trades"],en.trades):d["symbol"]=t.symbol
+        r["symbols"]={k:s._symbol_stats([t for t in en.trades if t.symbol==k]) for k in data}
+        r["skipped"]=skipped;r["no_margin"]=nomargin;r["max_open"]=s.max_open
+        return r
+    def _symbol_stats(s,trades):
+        pn=[t.pnl for t in trades];w=[p for p in pn if p>0];l=[p for p in pn if p<=0]
+        return {"trades":len(trades),"win_rate":round(len(w)/max(len(trades),1)*100,1),
+            "pnl":round(sum(pn),2),"return_pct":round(sum(pn)/s.ib*100,2),
+            "profit_factor":round(abs(sum(w))/abs(sum(l)),2) if l and sum(l)!=0 else 999,
+            "avg_r_multiple":round(np.mean([t.r_multiple for t in trades]),2) if trades else 0}
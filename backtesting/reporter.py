@@ -74,6 +74,6 @@ class BacktestReporter:
         fp=os.path.join(RD,f"{name}.json")
         try:
             with open(fp,"w") as f:
-                json.dump({k:r[k] for k in ["summary","direction_stats","signal_stats","monthly_returns","trades"] if k in r},f,indent=2,default=str)
+                json.dump({k:r[k] for k in ["summary","direction_stats","signal_stats","monthly_returns","symbols","trades"] if k in r},f,indent=2,default=str)
             print(f"  Saved: {fp}")
         except Exception as e:logger.error(f"Save: {e}")
@@ -0,0 +1,82 @@
+import os,glob,hashlib,json,functools,numpy as np,pandas as pd
+from utils.logger import setup_logger
+logger=setup_logger("Signals")
+SD="data/signals"
+SIGNAL_COLS=["signal","direction","confidence","entry","stop_loss","take_profit"]
+# Unrounded entry and entry-to-stop distance behind take_profit (analyze()'s "target_base")
+TARGET_COLS=["tp_base","tp_risk"]
+ACTIONABLE=("STRONG_BUY","BUY","STRONG_SELL","SELL")
+# Settings BacktestEngine.replay applies itself (sizing, and the target via TARGET_COLS):
+# a signal table is valid for any value of these
+REPLAY_PARAMS=("RISK_PER_TRADE","LEVERAGE","RISK_REWARD_RATIO")
+# Settings the strategy analysis reads (plus the engine's analysis windows and the MTF timeframes)
+SIGNAL_PARAMS=("SWING_LOOKBACK","OB_LOOKBACK","VP_LEVELS","FVG_MIN_SIZE","FVG_LOOKBACK","LIQUIDITY_THRESHOLD",
+    "SWEEP_LOOKBACK","BT_WINDOW","BT_HTF_WINDOW","TF_DIRECTION","TF_STRUCTURE","TF_ENTRY","TF_SNIPER")
+SRC=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"strategy")
+
+def signal_params(cfg,extra=()):
+    """The settings of cfg a signal table depends on: SIGNAL_PARAMS + `extra` (e.g. the grid's keys)"""
+    return {k:getattr(cfg,k) for k in (*SIGNAL_PARAMS,*extra) if k not in REPLAY_PARAMS and hasattr(cfg,k)}
+
+@functools.lru_cache(maxsize=None)
+def strategy_version():
+    """Hash of the strategy/ sources: a code change invalidates every stored table"""
+    h=hashlib.sha1()
+    for fp in sorted(glob.glob(os.path.join(SRC,"*.py"))):
+        with open(fp,"rb") as f:h.update(os.path.basename(fp).encode()+f.read())
+    return h.hexdigest()[:16]
+
+def frame_hash(*frames):
+    """Hash of the timestamps and OHLCV values of frames (None skipped)"""
+    h=hashlib.sha1()
+    for df in frames:
+        if df is None:h.update(b"-");continue
+        h.update(df.index.asi8.tobytes())
+        h.update(np.ascontiguousarray(df[["open","high","low","close","volume"]].to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+def signal_key(df,params=None,htf=None,**meta):
+    """Name for a signal table: the candles it was built on, the strategy code + the parameters that shape the signals"""
+    raw=json.dumps({"start":str(df.index[0]),"end":str(df.index[-1]),"n":len(df),"data":frame_hash(df,htf),
+        "strategy":strategy_version(),"params":params or {},**meta},sort_keys=True,default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def store_path(cache=None):
+    """SD when signal tables persist (cache, default Config.SIGNAL_CACHE), else None"""
+    if cache is None:
+        from config import Config
+        cache=Config().SIGNAL_CACHE
+    return SD if cache else None
+
+class SignalStore:
+    """
+    Signal tables (BacktestEngine.signals) as CSV files, so replays can skip the analysis
+    phase. path=None stores nothing: get() always builds.
+    """
+    def __init__(s,path=SD):
+        s.path=path
+        if path:os.makedirs(path,exist_ok=True)
+    def file(s,name):return os.path.join(s.path,f"{name}.csv")
+    def save(s,table,name):
+        if not s.path:return
+        try:table.to_csv(s.file(name),index_label="timestamp")
+        except Exception as e:logger.error(f"Save signals: {e}")
+    def load(s,name):
+        if not s.path:return None
+        fp=s.file(name)
+        if not os.path.exists(fp):return None
+        try:
+            t=pd.read_csv(fp,index_col="timestamp",parse_dates=["timestamp"],float_precision="round_trip")
+            return t[SIGNAL_COLS+TARGET_COLS]
+        except Exception as e:logger.error(f"Load signals: {e}");return None
+    def get(s,name,build):
+        """Stored table `name`, or build() it and store it"""
+        t=s.load(name)
+        if t is None:t=build();s.save(t,name)
+        return t
+    def clear(s):
+        """Delete every stored table; returns how many"""
+        if not s.path:return 0
+        fs=glob.glob(os.path.join(s.path,"*.csv"))
+        for fp in fs:os.remove(fp)
+        return len(fs)
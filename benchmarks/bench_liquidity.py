@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Equal-highs/lows clustering benchmark
+python3 benchmarks/bench_liquidity.py           500 / 5k / 50k bars (legacy 50k is extrapolated)
+python3 benchmarks/bench_liquidity.py --full    also run the legacy O(n^2) scan at 50k (slow)
+"""
+import os,sys,time,argparse
+import numpy as np,pandas as pd
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from strategy.liquidity import LiquidityAnalyzer
+
+
+def make_candles(n,seed=7):
+    r=np.random.default_rng(seed)
+    c=60000+np.cumsum(r.normal(0,40,n))
+    h=np.round(c+np.abs(r.normal(0,30,n)),1)
+    l=np.round(c-np.abs(r.normal(0,30,n)),1)
+    idx=pd.date_range("2024-01-01",periods=n,freq="1min")
+    return pd.DataFrame({"open":c,"high":h,"low":l,"close":c,"volume":1.0},index=idx)
+
+
+def legacy_eq_levels(series,tol,th):
+    """Pairwise scan as it was before the searchsorted version"""
+    levels=[];vals=series.values
+    for i in range(len(vals)-1):
+        t=1;s=vals[i]
+        for j in range(i+1,len(vals)):
+            if abs(vals[j]-vals[i])<=tol:t+=1;s+=vals[j]
+        if t>=th:
+            avg=s/t
+            if not any(abs(l["level"]-avg)<=tol for l in levels):
+                levels.append({"level":round(avg,2),"touches":t})
+    return levels
+
+
+def timed(fn,repeat=1):
+    best=float("inf")
+    for _ in range(repeat):
+        t0=time.perf_counter();out=fn();best=min(best,time.perf_counter()-t0)
+    return best,out
+
+
+def main():
+    p=argparse.ArgumentParser()
+    p.add_argument("--sizes",type=str,default="500,5000,50000")
+    p.add_argument("--full",action="store_true",help="Run the legacy scan at every size")
+    a=p.parse_args()
+    la=LiquidityAnalyzer()
+    print(f"\n  {'Bars':>7} {'Legacy':>11} {'New':>10} {'Speedup':>9}  Same")
+    print(f"  {'-'*46}")
+    base=None
+    for n in [int(x) for x in a.sizes.split(",")]:
+        df=make_candles(n);tol=df["close"].iloc[-1]*0.001
+        tn,new=timed(lambda:la._eq_levels(df["high"],tol),3)
+        if a.full or n<=5000:
+            tl,old=timed(lambda:legacy_eq_levels(df["high"],tol,la.th))
+            same="yes" if old==new else "NO";base=(n,tl);est=""
+        else:
+            # O(n^2): scale the largest measured legacy run
+            tl=base[1]*(n/base[0])**2 if base else float("nan");same="-";est="~"
+        print(f"  {n:>7} {est+f'{tl:.3f}s':>11} {tn:>9.4f}s {tl/tn:>8.0f}x  {same}")
+    print()
+
+
+if __name__=="__main__":main()
@@ -23,15 +23,25 @@ class Config:
     MAX_DRAWDOWN = float(os.getenv("MAX_DRAWDOWN", "0.15"))
     SWING_LOOKBACK = int(os.getenv("SWING_LOOKBACK", "10"))
     OB_LOOKBACK = int(os.getenv("OB_LOOKBACK", "50"))
+    VP_LEVELS = int(os.getenv("VP_LEVELS", "20"))
     FVG_MIN_SIZE = float(os.getenv("FVG_MIN_SIZE", "0.001"))
+    FVG_LOOKBACK = int(os.getenv("FVG_LOOKBACK", "50"))
     LIQUIDITY_THRESHOLD = float(os.getenv("LIQUIDITY_THRESHOLD", "3"))
+    SWEEP_LOOKBACK = int(os.getenv("SWEEP_LOOKBACK", "5"))
     BOS_CONFIRMATION_CANDLES = int(os.getenv("BOS_CONFIRMATION_CANDLES", "3"))
+    INCREMENTAL_STRUCTURE = os.getenv("INCREMENTAL_STRUCTURE", "True").lower() == "true"
+    MTF_CACHE = os.getenv("MTF_CACHE", "True").lower() == "true"
+    USE_NUMBA = os.getenv("USE_NUMBA", "True").lower() == "true"
     ML_ENABLED = os.getenv("ML_ENABLED", "True").lower() == "true"
     ML_RETRAIN_HOURS = int(os.getenv("ML_RETRAIN_HOURS", "24"))
     ML_MIN_SAMPLES = int(os.getenv("ML_MIN_SAMPLES", "100"))
     ML_CONFIDENCE_THRESHOLD = float(os.getenv("ML_CONFIDENCE_THRESHOLD", "0.6"))
     SLEEP_BETWEEN_CYCLES = int(os.getenv("SLEEP_BETWEEN_CYCLES", "5"))
     CACHE_CANDLES = os.getenv("CACHE_CANDLES", "True").lower() == "true"
+    CANDLE_BUFFER = int(os.getenv("CANDLE_BUFFER", "1000"))
+    BT_WINDOW = int(os.getenv("BT_WINDOW", "500"))
+    BT_HTF_WINDOW = int(os.getenv("BT_HTF_WINDOW", "200"))
+    SIGNAL_CACHE = os.getenv("SIGNAL_CACHE", "False").lower() == "true"
     LOW_POWER_MODE = os.getenv("LOW_POWER_MODE", "False").lower() == "true"
     LONDON_OPEN = 8; LONDON_CLOSE = 16; NY_OPEN = 13; NY_CLOSE = 21; ASIA_OPEN = 0; ASIA_CLOSE = 8
     TELEGRAM_ENABLED = os.getenv("TELEGRAM_ENABLED", "False").lower() == "true"
@@ -65,6 +65,15 @@ class ExchangeConnector:
 
     def fetch_ohlcv(s,symbol=None,timeframe=None,limit=500):
         """داده از بایننس (بیشتر و بهتر)"""
+        ohlcv=s.fetch_ohlcv_rows(symbol,timeframe,limit)
+        if not ohlcv:return pd.DataFrame()
+        df=pd.DataFrame(ohlcv,columns=["timestamp","open","high","low","close","volume"])
+        df["timestamp"]=pd.to_datetime(df["timestamp"],unit="ms")
+        df.set_index("timestamp",inplace=True)
+        return df.astype(float)
+
+    def fetch_ohlcv_rows(s,symbol=None,timeframe=None,limit=500,min_rows=11):
+        """Raw ccxt rows [ts_ms,o,h,l,c,v], oldest first; [] if no source returned min_rows"""
         symbol=symbol or s.config.SYMBOL
         timeframe=timeframe or s.config.TIMEFRAME
 
@@ -73,21 +82,15 @@ class ExchangeConnector:
             for attempt in range(3):
                 try:
                     ohlcv=src.fetch_ohlcv(symbol,timeframe,limit=limit)
-                    df=pd.DataFrame(ohlcv,columns=["timestamp","open","high","low","close","volume"])
-                    df["timestamp"]=pd.to_datetime(df["timestamp"],unit="ms")
-                    df.set_index("timestamp",inplace=True)
-                    df=df.astype(float)
-
-                    if len(df)>10:
-                        days=(df.index[-1]-df.index[0]).days
-                        logger.debug(f"Got {len(df)} candles ({timeframe}) = {days}d from {src_name}")
-                        return df
+                    if len(ohlcv)>=min_rows:
+                        logger.debug(f"Got {len(ohlcv)} candles ({timeframe}) from {src_name}")
+                        return ohlcv
                 except Exception as e:
                     logger.debug(f"{src_name} try {attempt+1}: {e}")
                     time.sleep(1)
 
         logger.error("All data sources failed")
-        return pd.DataFrame()
+        return []
 
     def fetch_ohlcv_extended(s,symbol=None,timeframe=None,days=90):
         """داده طولانی با چند بار درخواست"""
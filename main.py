@@ -12,6 +12,7 @@ from datetime import datetime
 from config import Config
 from exchange.connector import ExchangeConnector
 from strategy.smart_money import SmartMoneyStrategy
+from strategy import kernels
 from risk_management.manager import RiskManager
 from ml.brain import MLBrain
 from utils.logger import setup_logger
@@ -24,6 +25,7 @@ class SmartMoneyBot:
         s.config=Config();s.exchange=ExchangeConnector();s.strategy=SmartMoneyStrategy()
         s.risk=RiskManager();s.ml=MLBrain();s.notif=TelegramNotifier();s.perf=PerformanceManager()
         s.trade=None;s.running=False;s.ptp=0;s.cy=0
+        s.perf.register_cache("htf_cache",s.strategy.ob.htf_cache);s.perf.register_cache("mtf_cache",s.strategy.mtf.tf_cache)
 
     def start(s):
         print(f"\n{'='*55}")
@@ -36,6 +38,7 @@ class SmartMoneyBot:
         print(f"  Risk:      {s.config.RISK_PER_TRADE*100}%")
         print(f"  R:R:       1:{s.config.RISK_REWARD_RATIO}")
         print(f"  ML:        {s.config.ML_ENABLED}")
+        print(f"  Kernels:   {kernels.BACKEND}")
         print(f"  Mode:      {'TESTNET' if s.config.TESTNET else 'LIVE'}")
         print(f"{'='*55}")
         bal=s.exchange.get_balance()
@@ -85,7 +88,7 @@ class SmartMoneyBot:
         if not can["allowed"]:
             if s.cy%10==0:logger.info(f"Blocked: {can['reason']}")
             return
-        a=s.strategy.analyze(edf,sdf,ddf,sndf)
+        a=s.strategy.analyze(edf,sdf,ddf,sndf,symbol=sym)
         if s.config.ML_ENABLED and a.get("features"):
             s.ml.record_analysis(a["features"],a["signal"],p)
         ml={"should_trade":True,"ml_confidence":0.5}
@@ -125,7 +128,7 @@ class SmartMoneyBot:
     def _manage(s,df,pos,price):
         if not s.trade:return
         entry=s.trade["entry"];d=s.trade["direction"]
-        atr=s.strategy.calculate_atr(df)
+        atr=s.strategy.ind.snapshot(df,symbol=s.config.SYMBOL)["atr"]
         be=s.risk.should_break_even(entry,price,d,s.trade["stop_loss"])
         if be and be!=s.trade["stop_loss"] and s.ptp==0:
             s.trade["stop_loss"]=be;logger.info(f"Break-even: ${be:,.2f}")
@@ -159,6 +162,7 @@ class SmartMoneyBot:
         logger.info(f"Balance: ${bal:,.2f} | Daily: ${rs['daily_pnl']:+.2f} | Total: ${rs['total_pnl']:+.2f}")
         logger.info(f"Trades: {rs['total_trades']} | WR: {rs['win_rate']}% | PF: {rs.get('profit_factor',0)}")
         logger.info(f"Cycle: {ps['avg_cycle_time']} | Cache: {ps['cache']}")
+        for k in s.perf.caches:logger.info(f"{k}: {ps[k]}")
         if s.config.ML_ENABLED:
             ms=s.ml.get_stats()
             logger.info(f"ML: {'Ready' if ms['model_ready'] else 'No'} | Acc: {ms['model_accuracy']}%")
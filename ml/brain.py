@@ -108,20 +108,23 @@ class MLBrain:
     def generate_synthetic_data(self,df,strategy,n=200):
         logger.info(f"Generating {n} synthetic samples...")
         if len(df)<100: return 0
-        cnt=0; step=max(1,(len(df)-60)//n)
-        for i in range(50,len(df)-10,step):
+        cnt=0; step=max(1,(len(df)-60)//n); ix=list(range(50,len(df)-10,step))
+        # Row df.index[i-1] of the table is the analysis of the full prefix up to bar i-1 (window=0;
+        # bars that failed are missing); the kill zone is rated at each bar's close time
+        try: tab=strategy.analyze_series(df,bars=[i-1 for i in ix],window=0)
+        except Exception as e: logger.error(f"Synthetic data: {e}"); return 0
+        for i in ix:
             if cnt>=n: break
+            if df.index[i-1] not in tab.index: continue
+            a=tab.loc[df.index[i-1]]
             try:
-                sub=df.iloc[:i].copy()
-                if len(sub)<50: continue
-                a=strategy.analyze(sub)
                 if a["signal"]=="NO_SIGNAL": continue
-                entry=sub["close"].iloc[-1]; future=df.iloc[i:i+10]
+                entry=df["close"].iloc[i-1]; future=df.iloc[i:i+10]
                 if len(future)<5: continue
                 if a["direction"]=="long": pp=(future["high"].max()-entry)/entry; pl=(entry-future["low"].min())/entry
                 else: pp=(entry-future["low"].min())/entry; pl=(future["high"].max()-entry)/entry
                 outcome=1 if pp>pl and pp>0.005 else 0
-                self.trade_data.append({"timestamp":str(sub.index[-1]),"features":a["features"],"signal":a["signal"],"entry_price":entry,"outcome":outcome,"pnl_pct":round((pp if outcome else -pl)*100,4),"synthetic":True})
+                self.trade_data.append({"timestamp":str(df.index[i-1]),"features":{c:float(a[c]) for c in FC},"signal":a["signal"],"entry_price":entry,"outcome":outcome,"pnl_pct":round((pp if outcome else -pl)*100,4),"synthetic":True})
                 cnt+=1
             except: continue
         self._save()
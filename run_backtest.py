@@ -3,7 +3,7 @@
 Smart Money Backtest Engine v3
 Interactive Menu + Smart Analysis
 """
-import sys,os,json,argparse
+import sys,os,json,argparse,importlib
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -12,6 +12,9 @@ from exchange.connector import ExchangeConnector
 from strategy.smart_money import SmartMoneyStrategy
 from backtesting.engine import BacktestEngine
 from backtesting.reporter import BacktestReporter
+from backtesting.portfolio import PortfolioEngine
+from backtesting.optimizer import grid_search,halving_search,walk_forward,fold_sizes,score
+from backtesting.signals import REPLAY_PARAMS,SignalStore
 from utils.logger import setup_logger
 logger=setup_logger("BT")
 
@@ -58,6 +61,17 @@ def fetch_data(exchange,symbol,tf,htf,days):
     return df,htf_df
 
 
+def fetch_aux(exchange,symbol,days,config):
+    """Direction + sniper timeframes for the multi-timeframe path (run(..., aux=...))"""
+    aux={}
+    for key,tf in (("direction_df",config.TF_DIRECTION),("sniper_df",config.TF_SNIPER)):
+        print(f"  Requesting {tf} candles ({key.split('_')[0]})...")
+        d=exchange.fetch_ohlcv_extended(symbol,tf,days) if hasattr(exchange,"fetch_ohlcv_extended") else exchange.fetch_ohlcv(symbol,tf,500)
+        if d is not None and not d.empty:
+            aux[key]=d;print(f"  {colored('OK','green')} {len(d)} candles ({tf})")
+    return aux
+
+
 def analyze_trades(report):
     """تحلیل هوشمند معاملات - پیدا کردن مشکلات"""
     if "error" in report or not report.get("trades"):
@@ -276,65 +290,66 @@ def display_trade_log(trades,limit=20):
     print(f"{'='*75}")
 
 
-def auto_optimize(exchange,symbol,tf,htf,df,htf_df):
+GRID={
+    "RISK_PER_TRADE":[0.01,0.015,0.02,0.025],
+    "RISK_REWARD_RATIO":[1.5,2.0,2.5,3.0],
+    "SWING_LOOKBACK":[5,8,10,15],
+    "OB_LOOKBACK":[30,50,70],
+}
+
+
+def load_grid(path):
+    """Parameter grid from a JSON file: {"PARAM": [values], ...}"""
+    with open(path) as f:grid=json.load(f)
+    if not isinstance(grid,dict) or not all(isinstance(v,list) and v for v in grid.values()):
+        raise ValueError(f"{path}: expected {{param: [values]}}")
+    return grid
+
+
+def load_score(spec):
+    """Scoring function from "module:function" (called with a report summary, higher is better)"""
+    mod,_,fn=spec.partition(":")
+    if not fn:raise ValueError(f"--score expects module:function, got {spec!r}")
+    return getattr(importlib.import_module(mod),fn)
+
+
+def auto_optimize(exchange,symbol,tf,htf,df,htf_df,workers=None,grid=None,score_fn=None,
+                  search="grid",surrogate=False,eta=3,max_configs=None):
     """بهینه‌سازی خودکار"""
-    import itertools
     print(colored("\n  AUTO-OPTIMIZATION","bold"))
     print(f"{'='*55}")
 
-    grid={
-        "RISK_PER_TRADE":[0.01,0.015,0.02,0.025],
-        "RISK_REWARD_RATIO":[1.5,2.0,2.5,3.0],
-        "SWING_LOOKBACK":[5,8,10,15],
-        "OB_LOOKBACK":[30,50,70],
-    }
-
-    combos=list(itertools.product(*grid.values()))
-    keys=list(grid.keys())
-    results=[]
-    total=len(combos)
+    grid=grid or GRID;score_fn=score_fn or score
 
-    print(f"  Testing {total} parameter combinations...\n")
+    # Only the parameters outside REPLAY_PARAMS need their own strategy analysis
+    total=int(np.prod([len(v) for v in grid.values()]))
+    nsets=int(np.prod([len(v) for k,v in grid.items() if k not in REPLAY_PARAMS]))
+    print(f"  Testing {total} parameter combinations ({nsets} signal sets) on {workers or os.cpu_count()} worker(s)...")
+    if search=="halving":print(f"  Successive halving (eta={eta}{', surrogate' if surrogate else ''}{f', max {max_configs} configs' if max_configs else ''})")
+    print()
 
-    for i,combo in enumerate(combos):
-        params=dict(zip(keys,combo))
-        try:
-            cfg=Config()
-            for k,v in params.items():setattr(cfg,k,v)
-            st=SmartMoneyStrategy();st.config=cfg
-            en=BacktestEngine(st);en.config=cfg
-            r=en.run(df.copy(),htf_df,progress=False)
-            if "error" not in r:
-                s=r["summary"]
-                score=0
-                score+=min(s["total_return_pct"],200)*0.25
-                score+=s["win_rate"]*0.2
-                score+=min(s["profit_factor"],5)*8*0.2
-                score-=s["max_drawdown_pct"]*0.2
-                score+=min(s["sharpe_ratio"],3)*10*0.15
-                if s["total_trades"]>=5:score+=5
-
-                results.append({
-                    "params":params,"score":round(score,1),
-                    "ret":s["total_return_pct"],"wr":s["win_rate"],
-                    "pf":s["profit_factor"],"dd":s["max_drawdown_pct"],
-                    "sh":s["sharpe_ratio"],"trades":s["total_trades"],
-                })
-        except:pass
+    def progress(done,total,best):
+        pct=done/total*100
+        bar="█"*int(pct//5)+"░"*(20-int(pct//5))
+        print(f"  [{bar}] {pct:.0f}% | Best: {best or 0:.1f}",end="\r")
 
-        if (i+1)%20==0 or i==total-1:
-            pct=(i+1)/total*100
-            bar="█"*int(pct//5)+"░"*(20-int(pct//5))
-            best_sc=max((r["score"] for r in results),default=0)
-            print(f"  [{bar}] {pct:.0f}% | Best: {best_sc:.1f}",end="\r")
+    meta={"symbol":symbol,"tf":tf,"htf":htf}
+    if search=="halving":
+        results,failures=halving_search(df,htf_df,grid,workers,meta,progress,score_fn,eta=eta,
+                                        max_configs=max_configs,surrogate=surrogate)
+    else:results,failures=grid_search(df,htf_df,grid,workers,meta,progress,score_fn)
 
     print("\n")
 
+    if failures:
+        print(colored(f"  {len(failures)} combination(s) failed:","red"))
+        for f in failures[:5]:
+            print(f"    {f['params']}: {f['error']}")
+        if len(failures)>5:print(f"    ... and {len(failures)-5} more")
+
     if not results:
         print(colored("  No valid results!","red"));return
 
-    results.sort(key=lambda x:x["score"],reverse=True)
-
     print(f"  {'='*70}")
     print(f"  {'#':>3} {'Return':>8} {'WR':>6} {'PF':>6} {'DD':>7} {'Sharpe':>7} {'Trades':>6} {'Score':>6}")
     print(f"  {'-'*67}")
@@ -652,6 +667,70 @@ def multi_tf_backtest(exchange,config):
         print(colored(f"\n  Best: {best_name}","green"))
 
 
+def walk_forward_test(symbol,tf,htf,df,htf_df,workers=None,grid=None,score_fn=None,folds=4,train_ratio=3.0):
+    """Walk-forward: optimize on rolling train windows, trade each winner on the window after it"""
+    print(colored("\n  WALK-FORWARD OPTIMIZATION","bold"))
+    print(f"{'='*55}")
+
+    train,test=fold_sizes(len(df),folds,train_ratio)
+    grid=grid or GRID
+    print(f"  {folds} folds | train {train} bars | test {test} bars | {int(np.prod([len(v) for v in grid.values()]))} combinations\n")
+
+    def progress(done,total,best):
+        pct=done/total*100
+        bar="█"*int(pct//5)+"░"*(20-int(pct//5))
+        print(f"  [{bar}] {pct:.0f}% | Best: {best or 0:.1f}",end="\r")
+
+    wf=walk_forward(df,htf_df,grid,train,test,workers,{"symbol":symbol,"tf":tf,"htf":htf},progress,score_fn or score)
+    print("\n")
+
+    if wf["failures"]:
+        print(colored(f"  {len(wf['failures'])} combination(s) failed","red"))
+
+    print(f"  {'#':>3} {'Test period':<23} {'Train':>6} {'Return':>8} {'WR':>6} {'DD':>7} {'Trades':>6}  Params")
+    print(f"  {'-'*80}")
+    for i,f in enumerate(wf["folds"],1):
+        su=f["summary"]
+        if "error" in su:
+            print(f"  {i:>3} {f['test'][0][:10]} - {f['test'][1][:10]} {su['error']}");continue
+        color="green" if su["total_return_pct"]>0 else "red"
+        ps=" ".join(f"{k}={v}" for k,v in f["params"].items())
+        print(colored(f"  {i:>3} {f['test'][0][:10]} - {f['test'][1][:10]} {f['train_score']:>6.1f} "
+            f"{su['total_return_pct']:>+7.1f}% {su['win_rate']:>5.1f}% {su['max_drawdown_pct']:>6.1f}% {su['total_trades']:>6}  {ps}",color))
+
+    print(colored("\n  OUT-OF-SAMPLE (stitched test windows)","bold"))
+    BacktestReporter().display(wf["report"])
+    return wf
+
+
+def portfolio_backtest(exchange,symbols,tf,htf,days,balance=10000,commission=0.0006,slippage=0.0002,workers=None):
+    """Basket backtest: every symbol on one balance, at most MAX_OPEN_TRADES open at once"""
+    print(colored(f"\n  PORTFOLIO BACKTEST: {', '.join(symbols)}","bold"))
+    print(f"{'='*55}")
+
+    data={}
+    for sym in symbols:
+        print(f"\n  {colored(sym,'cyan')}")
+        df,htf_df=fetch_data(exchange,sym,tf,htf,days)
+        if df is not None:data[sym]=(df,htf_df)
+    if not data:return None
+
+    pe=PortfolioEngine(balance,commission,slippage)
+    print(f"\n  {len(data)} symbols | max {pe.max_open} open trades | {workers or os.cpu_count()} worker(s)")
+    report=pe.run(data,workers=workers,meta={"tf":tf,"htf":htf})
+    BacktestReporter().display(report)
+    if "error" in report:return report
+
+    print(f"  {'Symbol':<14} {'Trades':>6} {'WR':>6} {'PF':>6} {'Avg R':>6} {'PnL':>12} {'Return':>8}")
+    print(f"  {'-'*64}")
+    for sym,st in report["symbols"].items():
+        color="green" if st["pnl"]>0 else "red"
+        print(colored(f"  {sym:<14} {st['trades']:>6} {st['win_rate']:>5.1f}% {st['profit_factor']:>6.2f} "
+            f"{st['avg_r_multiple']:>6.2f} ${st['pnl']:>+11,.2f} {st['return_pct']:>+7.1f}%",color))
+    print(f"  Signals skipped at the open-trade limit: {report['skipped']} | without free margin: {report['no_margin']}\n")
+    return report
+
+
 def optimization_menu(exchange,config):
     """منوی بهینه‌سازی"""
     print(colored("\n  OPTIMIZATION","bold"))
@@ -784,6 +863,20 @@ def main():
     p.add_argument("--save",action="store_true")
     p.add_argument("--optimize",action="store_true")
     p.add_argument("--analyze",action="store_true")
+    p.add_argument("--mtf",action="store_true",help="4-timeframe analysis (adds TF_DIRECTION / TF_SNIPER)")
+    p.add_argument("--workers",type=int,default=None,help="Optimizer processes (default: all cores)")
+    p.add_argument("--grid",type=str,default=None,help="Optimizer grid JSON file {param: [values]}")
+    p.add_argument("--score",type=str,default=None,help="Optimizer score function module:function")
+    p.add_argument("--search",choices=["grid","halving"],default="grid",help="Exhaustive grid or successive halving")
+    p.add_argument("--eta",type=int,default=3,help="Halving: keep 1/eta of the configs per rung")
+    p.add_argument("--max-configs",type=int,default=None,help="Halving: configs tried on the first rung")
+    p.add_argument("--surrogate",action="store_true",help="Halving: propose configs with a random forest (scikit-learn)")
+    p.add_argument("--symbols",type=str,default=None,help="Comma-separated basket for a portfolio backtest")
+    p.add_argument("--walk-forward",action="store_true",help="Walk-forward optimization with out-of-sample report")
+    p.add_argument("--folds",type=int,default=4,help="Walk-forward: number of test windows")
+    p.add_argument("--train-ratio",type=float,default=3.0,help="Walk-forward: train window length / test window length")
+    p.add_argument("--signal-cache",action="store_true",help="Keep signal tables in data/signals for later runs (SIGNAL_CACHE)")
+    p.add_argument("--clear-signals",action="store_true",help="Delete the stored signal tables and exit")
     a=p.parse_args()
 
     # Default to menu if no args
@@ -792,22 +885,39 @@ def main():
         return
 
     # Command line mode
+    if a.clear_signals:
+        print(f"  Removed {SignalStore().clear()} stored signal table(s)")
+        return
+    if a.signal_cache:Config.SIGNAL_CACHE=True
     c=Config()
     exc=ExchangeConnector()
     sym=a.symbol or c.SYMBOL
     tf=a.timeframe or c.TF_ENTRY
     htf=a.htf or c.TF_STRUCTURE
 
-    if a.optimize:
+    grid=load_grid(a.grid) if a.grid else None
+    score_fn=load_score(a.score) if a.score else None
+    if a.symbols:
+        syms=[x.strip() for x in a.symbols.split(",") if x.strip()]
+        report=portfolio_backtest(exc,syms,tf,htf,a.days,a.balance,a.commission,a.slippage,a.workers)
+        if a.save and report and "error" not in report:
+            BacktestReporter().save(report,f"portfolio_{'_'.join(x.replace('/','') for x in syms)}_{tf}_{a.days}d")
+    elif a.walk_forward:
+        df,htf_df=fetch_data(exc,sym,tf,htf,a.days)
+        if df is not None:
+            wf=walk_forward_test(sym,tf,htf,df,htf_df,a.workers,grid,score_fn,a.folds,a.train_ratio)
+            if a.save:BacktestReporter().save(wf["report"],f"wf_{sym.replace('/','_')}_{tf}_{a.days}d")
+    elif a.optimize:
         df,htf_df=fetch_data(exc,sym,tf,htf,a.days)
         if df is not None:
-            auto_optimize(exc,sym,tf,htf,df,htf_df)
+            auto_optimize(exc,sym,tf,htf,df,htf_df,a.workers,grid,score_fn,a.search,a.surrogate,a.eta,a.max_configs)
     else:
         df,htf_df=fetch_data(exc,sym,tf,htf,a.days)
         if df is None:return
+        aux=fetch_aux(exc,sym,a.days,c) if a.mtf else None
         st=SmartMoneyStrategy()
         en=BacktestEngine(st,a.balance,a.commission,a.slippage)
-        report=en.run(df,htf_df)
+        report=en.run(df,htf_df,aux=aux)
         rp=BacktestReporter();rp.display(report)
 
         if a.analyze or True:
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def bar_period(index):
+    """Typical spacing of a DatetimeIndex (median step), zero for fewer than two bars"""
+    if len(index) < 2:
+        return pd.Timedelta(0)
+    return pd.Timedelta(int(np.median(np.diff(index.asi8))), unit=index.unit)
+
+
+def closed_counts(index, htf_index, period=None, htf_period=None):
+    """
+    For every bar of `index`: how many `htf_index` candles have closed by the time that
+    bar closes. htf.iloc[:counts[i]] is the higher-timeframe history bar i may see;
+    the HTF candle still forming at that moment is left out, so nothing leaks ahead.
+    """
+    if len(htf_index) == 0:
+        return np.zeros(len(index), dtype=np.int64)
+    period = bar_period(index) if period is None else period
+    htf_period = bar_period(htf_index) if htf_period is None else htf_period
+    return np.searchsorted(htf_index + htf_period, index + period, side="right")
+
+
+class AsOfFrames:
+    """
+    Zero-copy as-of views of auxiliary candle frames along an entry index
+
+    The cut-off of every frame for every entry bar is computed once with closed_counts,
+    so at(i) is a handful of iloc slices: per frame the last `window` candles that had
+    closed when bar i closed (None before the first one closes). Works for higher and
+    lower timeframes alike. window is an int for all frames or a {name: int} dict;
+    0 keeps the whole history.
+    """
+
+    def __init__(self, index, frames, window=0):
+        self.names = list(frames)
+        self.frames = {k: f for k, f in frames.items() if f is not None and len(f)}
+        self.counts = {k: closed_counts(index, f.index) for k, f in self.frames.items()}
+        self.window = window
+
+    def at(self, i):
+        """{name: view or None} for entry bar i"""
+        out = dict.fromkeys(self.names)
+        for k, f in self.frames.items():
+            c = self.counts[k][i]
+            w = self.window.get(k, 0) if isinstance(self.window, dict) else self.window
+            if c:
+                out[k] = f.iloc[max(0, c - w) if w else 0:c]
+        return out
@@ -0,0 +1,78 @@
+from functools import cached_property
+
+
+class AnalysisContext:
+    """
+    Everything one analyze() call derives from a (df, htf_df) pair, computed on first use
+
+    Structure, order blocks, sweeps, FVGs, volume-profile zones and indicators are
+    each built once and handed to every consumer (confluence, best-OB picks, signal,
+    features) instead of each consumer re-running its own detector. Build a new
+    context for every call: the frames are assumed not to change under it. symbol
+    selects the per-symbol incremental state of the detectors.
+    """
+
+    def __init__(self, df, htf_df, ms, ob, liq, ind, stream="entry", symbol=None):
+        self.df = df
+        self.htf_df = htf_df
+        self.ms = ms
+        self.ob = ob
+        self.liq = liq
+        self.ind = ind
+        self.stream = stream
+        self.symbol = symbol
+        self._best = {}
+
+    @property
+    def price(self):
+        return self.df["close"].iloc[-1]
+
+    @cached_property
+    def structure(self):
+        return self.ms.detect_structure(self.df, stream=self.stream, symbol=self.symbol)
+
+    @cached_property
+    def htf_structure(self):
+        return self.ms.detect_structure(self.htf_df, stream="htf", symbol=self.symbol)
+
+    @cached_property
+    def premium_discount(self):
+        return self.ms.get_premium_discount(self.df, self.structure)
+
+    @cached_property
+    def htf_context(self):
+        # HTF zones + HTF OBs (the detector's HTF cache), shared by OB scoring and vp_zones
+        if self.htf_df is not None and len(self.htf_df) >= 10:
+            return self.ob.htf_context(self.htf_df, self.symbol)
+        return None
+
+    @cached_property
+    def order_blocks(self):
+        return self.ob.find_order_blocks(self.df, self.htf_df, self.symbol, self.htf_context)
+
+    def best_ob(self, direction):
+        if direction not in self._best:
+            self._best[direction] = self.ob.get_best_ob(self.df, direction, self.htf_df, obs=self.order_blocks, symbol=self.symbol)
+        return self._best[direction]
+
+    @cached_property
+    def sweeps(self):
+        return self.liq.detect_liquidity_sweep(self.df)
+
+    @cached_property
+    def fvgs(self):
+        return self.liq.find_fvg(self.df)
+
+    @cached_property
+    def vp_zones(self):
+        if self.htf_context is not None:
+            return self.htf_context["vp_zones"]
+        return self.ob.volume_profile_lite(self.htf_df if self.htf_df is not None else self.df)
+
+    @cached_property
+    def indicators(self):
+        return self.ind.snapshot(self.df, self.stream, self.symbol)
+
+    @property
+    def atr(self):
+        return self.indicators["atr"]
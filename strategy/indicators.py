@@ -0,0 +1,164 @@
+import numpy as np
+from strategy import kernels
+
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+VOL_PERIOD = 20
+EMA_FAST = 12
+EMA_SLOW = 26
+
+
+# ── Full-series kernels (pandas semantics: NaN until the window is full) ──
+
+def rolling_mean(x, window):
+    """x.rolling(window).mean()"""
+    x = np.asarray(x, dtype=float)
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window).mean(axis=1)
+    return out
+
+
+def true_range(h, l, c):
+    """max(h-l, |h-prev c|, |l-prev c|); the first bar has no previous close and is just h-l"""
+    pc = np.concatenate(([np.nan], np.asarray(c, dtype=float)[:-1]))
+    return np.fmax(h - l, np.fmax(np.abs(h - pc), np.abs(l - pc)))
+
+
+def atr(h, l, c, period=ATR_PERIOD):
+    return rolling_mean(true_range(h, l, c), period)
+
+
+def _gains_losses(c):
+    delta = np.diff(np.asarray(c, dtype=float), prepend=np.nan)
+    return np.where(delta > 0, delta, 0.0), -np.where(delta < 0, delta, 0.0)
+
+
+def rsi(c, period=RSI_PERIOD):
+    """Simple-average RSI, same as the rolling-mean formula used across the strategy"""
+    g, l = _gains_losses(c)
+    g, l = rolling_mean(g, period), rolling_mean(l, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - 100 / (1 + g / np.where(l > 1e-10, l, 1e-10))
+
+
+def ema(x, span):
+    """ewm(span, adjust=True).mean(): sum(w^age * x) / sum(w^age) with w = 1 - 2/(span+1)"""
+    return kernels.ema(x, span)
+
+
+def macd(c, fast=EMA_FAST, slow=EMA_SLOW):
+    return ema(c, fast) - ema(c, slow)
+
+
+# ── Last-candle values ──
+
+def _tail_mean(x, window):
+    # Last value of rolling(window).mean(): only the last `window` values matter
+    return x[-window:].mean() if len(x) >= window else np.nan
+
+
+def _ema_sums(x, span):
+    # Numerator / denominator of the adjust=True EMA at the last value
+    w = (1 - 2 / (span + 1)) ** np.arange(len(x) - 1, -1, -1)
+    return np.dot(w, x), w.sum()
+
+
+class _StreamState:
+    __slots__ = ("df", "n", "first", "second", "last", "c0", "closed", "ema", "snap")
+
+
+class IndicatorEngine:
+    """
+    Last-candle RSI, ATR, volume SMA, EMA12/26 and MACD per candle stream
+
+    Results are memoized on the frame object, so every consumer of one frame in a
+    cycle shares one computation. The rolling values only read the last few bars,
+    so they are O(1) per call. The EMAs keep running weighted sums that exclude the
+    newest candle. The newest candle may still be forming and is re-read on every
+    call. When a candle is appended (the frame may also drop its oldest candle),
+    the sums are updated in O(1). Any other change rebuilds them from the frame, as
+    does a change to the last closed candle (time, high, low, close) or the first
+    close the sums were built on. State is kept per (symbol, stream).
+    """
+
+    def __init__(self):
+        self.streams = {}
+
+    def snapshot(self, df, stream="entry", symbol=None):
+        """Indicator values at the last candle of df; symbol / stream name the candle series df belongs to"""
+        key = (symbol, stream)
+        st = self.streams.get(key)
+        n = len(df)
+        if st is not None and st.df is df and st.n == n:
+            return st.snap
+        h = df["high"].to_numpy(dtype=float)
+        l = df["low"].to_numpy(dtype=float)
+        c = df["close"].to_numpy(dtype=float)
+        v = df["volume"].to_numpy(dtype=float)
+
+        if st is None or not self._advance(st, df, h, l, c):
+            st = self._seed(df, h, l, c)
+            self.streams[key] = st
+        st.df, st.n = df, n
+
+        k = max(ATR_PERIOD, RSI_PERIOD) + 1
+        g, lo = _gains_losses(c[-k:] if n > k else c)
+        gain, loss = _tail_mean(g, RSI_PERIOD), _tail_mean(lo, RSI_PERIOD)
+        tr = true_range(h[-k:], l[-k:], c[-k:]) if n > k else true_range(h, l, c)
+        snap = {
+            "rsi": 100 - (100 / (1 + gain / max(loss, 1e-10))),
+            "atr": _tail_mean(tr, ATR_PERIOD),
+            "vol_sma": _tail_mean(v, VOL_PERIOD),
+        }
+        x = c[-1]
+        for span, (s, d) in st.ema.items():
+            w = 1 - 2 / (span + 1)
+            snap[f"ema{span}"] = (s * w + x) / (d * w + 1)
+        snap["macd"] = snap[f"ema{EMA_FAST}"] - snap[f"ema{EMA_SLOW}"]
+        st.snap = snap
+        return snap
+
+    @staticmethod
+    def _closed(idx, h, l, c, i):
+        # (time, high, low, close) of bar i, the newest closed candle the sums depend on
+        return (idx[i], h[i], l[i], c[i]) if -len(idx) <= i else None
+
+    def _seed(self, df, h, l, c):
+        st = _StreamState()
+        idx = df.index
+        st.first = idx[0] if len(idx) else None
+        st.second = idx[1] if len(idx) > 1 else None
+        st.last = idx[-1] if len(idx) else None
+        st.c0 = c[0] if len(c) else np.nan
+        st.closed = self._closed(idx, h, l, c, -2)
+        st.ema = {span: _ema_sums(c[:-1], span) for span in (EMA_FAST, EMA_SLOW)}
+        return st
+
+    def _advance(self, st, df, h, l, c):
+        """Move the EMA sums to `df` if it is the same frame (newest candle re-read) or one candle on"""
+        idx = df.index
+        n = len(idx)
+        if n < 2 or st.last is None:
+            return False
+        if idx[-1] == st.last and idx[0] == st.first and n == st.n:
+            return c[0] == st.c0 and self._closed(idx, h, l, c, -2) == st.closed
+        if idx[-2] != st.last or self._closed(idx, h, l, c, -3) != st.closed:
+            return False
+        if idx[0] == st.first and n == st.n + 1 and c[0] == st.c0:
+            drop = False
+        elif idx[0] == st.second and n == st.n:
+            drop = True
+        else:
+            return False
+        # The previous newest candle is now closed: fold its final close into the sums
+        for span, (s, d) in st.ema.items():
+            w = 1 - 2 / (span + 1)
+            s, d = s * w + c[-2], d * w + 1
+            if drop:
+                age = w ** (n - 1)
+                s, d = s - age * st.c0, d - age
+            st.ema[span] = (s, d)
+        st.first, st.second, st.last, st.c0 = idx[0], idx[1], idx[-1], c[0]
+        st.closed = self._closed(idx, h, l, c, -2)
+        return True
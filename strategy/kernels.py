@@ -0,0 +1,259 @@
+"""
+Inner loops of the detectors (and the backtester) that do not vectorize well
+
+Each kernel has a NumPy implementation and, when numba is installed and USE_NUMBA
+is on, a JIT-compiled loop with the same results. The loops exit early where the
+NumPy version has to build a full mask, for example an OB scan stops at the
+mitigation candle.
+"""
+import bisect
+import numpy as np
+from config import Config
+from utils.logger import setup_logger
+logger = setup_logger("Kernels")
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKEND = "numba" if numba is not None and Config.USE_NUMBA else "numpy"
+if numba is None and Config.USE_NUMBA:
+    logger.info("Detector kernels: numpy (numba not installed)")
+else:
+    logger.info(f"Detector kernels: {BACKEND}")
+
+
+def _jit(fn):
+    return numba.njit(cache=True, nogil=True)(fn) if BACKEND == "numba" else None
+
+
+# ── OB touch / mitigation status ──
+
+def _touch_status_np(low, high, close, starts, top, bottom, bull):
+    n = len(close)
+    touches = np.zeros(len(starts), dtype=np.int64)
+    mitigated = np.zeros(len(starts), dtype=bool)
+    s0 = min(int(starts.min()), n) if len(starts) else n
+    if s0 >= n:
+        return touches, mitigated
+    low, high, close = low[s0:], high[s0:], close[s0:]
+    cols = np.arange(s0, n)
+    top, bottom, bull = top[:, None], bottom[:, None], bull[:, None]
+    active = cols[None, :] >= starts[:, None]
+
+    # Bullish: low wicks into zone / close below it. Bearish mirrors with highs.
+    touch = np.where(bull, (low <= top) & (low >= bottom), (high >= bottom) & (high <= top))
+    broke = np.where(bull, close < bottom, close > top) & active
+
+    mitigated = broke.any(axis=1)
+    end = np.where(mitigated, broke.argmax(axis=1), len(cols) - 1)
+    counted = touch & active & (np.arange(len(cols))[None, :] <= end[:, None])
+    return counted.sum(axis=1), mitigated
+
+
+def _touch_status_loop(low, high, close, starts, top, bottom, bull):
+    n = len(close)
+    m = len(starts)
+    touches = np.zeros(m, dtype=np.int64)
+    mitigated = np.zeros(m, dtype=np.bool_)
+    for k in range(m):
+        t = 0
+        for j in range(starts[k], n):
+            if bull[k]:
+                if low[j] <= top[k] and low[j] >= bottom[k]:
+                    t += 1
+                if close[j] < bottom[k]:
+                    mitigated[k] = True
+                    break
+            else:
+                if high[j] >= bottom[k] and high[j] <= top[k]:
+                    t += 1
+                if close[j] > top[k]:
+                    mitigated[k] = True
+                    break
+        touches[k] = t
+    return touches, mitigated
+
+
+_touch_status_jit = _jit(_touch_status_loop)
+
+
+def touch_status(low, high, close, starts, top, bottom, bull):
+    """
+    Per OB: wicks into [bottom, top] from starts[k] on, counted up to and including the
+    first close through the far side (mitigation). Returns (touches, mitigated).
+    """
+    if _touch_status_jit is not None:
+        return _touch_status_jit(low, high, close, starts.astype(np.int64), top, bottom, bull)
+    return _touch_status_np(low, high, close, starts, top, bottom, bull)
+
+
+# ── Equal highs/lows: dedupe candidate levels, exact bar-order sums ──
+
+def _eq_levels_np(vals, tol, cand, avgs, touches):
+    levels, counts, keys = [], [], []
+    ftol = float(tol)
+    # Plain floats for the sequential dedupe: numpy scalar math dominates the loop otherwise
+    for i, avg in zip(cand.tolist(), avgs.tolist()):
+        k = bisect.bisect_left(keys, avg)
+        if (k < len(keys) and abs(keys[k] - avg) <= ftol) or (k > 0 and abs(keys[k - 1] - avg) <= ftol):
+            continue
+        # Exact sum in bar order for the levels we keep, so rounding matches the scan
+        j = np.flatnonzero(np.abs(vals[i + 1:] - vals[i]) <= tol) + i + 1
+        lv = np.round(np.cumsum(np.concatenate(([vals[i]], vals[j])))[-1] / touches[i], 2)
+        bisect.insort(keys, float(lv))
+        levels.append(lv)
+        counts.append(touches[i])
+    return np.array(levels, dtype=float), np.array(counts, dtype=np.int64)
+
+
+def _eq_levels_loop(vals, tol, cand, avgs, touches):
+    n = len(vals)
+    levels = np.empty(len(cand))
+    counts = np.empty(len(cand), dtype=np.int64)
+    keys = np.empty(len(cand))
+    m = 0
+    for c in range(len(cand)):
+        i = cand[c]
+        avg = avgs[c]
+        k = np.searchsorted(keys[:m], avg)
+        if (k < m and abs(keys[k] - avg) <= tol) or (k > 0 and abs(keys[k - 1] - avg) <= tol):
+            continue
+        s = vals[i]
+        for j in range(i + 1, n):
+            if abs(vals[j] - vals[i]) <= tol:
+                s += vals[j]
+        lv = np.round(s / touches[i], 2)
+        keys[k + 1:m + 1] = keys[k:m].copy()
+        keys[k] = lv
+        levels[m] = lv
+        counts[m] = touches[i]
+        m += 1
+    return levels[:m], counts[:m]
+
+
+_eq_levels_jit = _jit(_eq_levels_loop)
+
+
+def eq_levels(vals, tol, cand, avgs, touches):
+    """
+    Walk the candidate bars in order and keep a level unless one already kept lies within
+    tol of its approximate average (avgs). Kept levels are re-averaged exactly: the bar's
+    value plus every later value within tol, summed in bar order, rounded to 2 decimals.
+    Returns (levels, touch counts).
+    """
+    if _eq_levels_jit is not None:
+        return _eq_levels_jit(vals, float(tol), cand.astype(np.int64), avgs, touches.astype(np.int64))
+    return _eq_levels_np(vals, tol, cand, avgs, touches)
+
+
+# ── EMA (ewm span, adjust=True) ──
+
+def _ema_np(x, span):
+    # Closed form in blocks: inside a block the weighted sums are one cumsum of x * w^-k,
+    # the carry from earlier blocks is scaled by w^k; blocks keep w^-k far from overflow
+    n = len(x)
+    w = 1 - 2 / (span + 1)
+    out = np.empty(n)
+    b = max(1, min(512, int(150 / -np.log10(w)))) if w > 0 else 1
+    s = d = 0.0
+    for a in range(0, n, b):
+        seg = x[a:a + b]
+        k = np.arange(len(seg))
+        up, down = w ** k, w ** -k
+        ss = up * (s * w + np.cumsum(seg * down))
+        dd = up * (d * w + np.cumsum(down))
+        out[a:a + b] = ss / dd
+        s, d = ss[-1], dd[-1]
+    return out
+
+
+def _ema_loop(x, span):
+    n = len(x)
+    w = 1 - 2 / (span + 1)
+    out = np.empty(n)
+    s = 0.0
+    d = 0.0
+    for i in range(n):
+        s = s * w + x[i]
+        d = d * w + 1.0
+        out[i] = s / d
+    return out
+
+
+_ema_jit = _jit(_ema_loop)
+
+
+def ema(x, span):
+    """sum(w^age * x) / sum(w^age) at every bar, w = 1 - 2/(span+1)"""
+    x = np.asarray(x, dtype=float)
+    if _ema_jit is not None:
+        return _ema_jit(x, float(span))
+    return _ema_np(x, span)
+
+
+# ── Backtest exits: first SL/TP touch with MFE/MAE ──
+
+def _first_hit_np(high, low, start, entry, sl, tp, long):
+    # Scan in doubling blocks so a trade closed after a few bars reads only a few bars
+    n = len(high)
+    a, b = start, 16
+    j, hit = n, -1
+    while a < n:
+        h, l = high[a:a + b], low[a:a + b]
+        stop = l <= sl if long else h >= sl
+        take = h >= tp if long else l <= tp
+        any_ = stop | take
+        if any_.any():
+            k = int(any_.argmax())
+            j, hit = a + k, 0 if stop[k] else 1
+            break
+        a += b
+        b *= 2
+    end = min(j + 1, n)
+    if end <= start:
+        return j, hit, 0.0, 0.0
+    up = max(0.0, float(high[start:end].max()) - entry)
+    down = max(0.0, entry - float(low[start:end].min()))
+    return (j, hit, up, down) if long else (j, hit, down, up)
+
+
+def _first_hit_loop(high, low, start, entry, sl, tp, long):
+    n = len(high)
+    fav = 0.0
+    adv = 0.0
+    for j in range(start, n):
+        h = high[j]
+        l = low[j]
+        if long:
+            fav = max(fav, h - entry)
+            adv = max(adv, entry - l)
+            if l <= sl:
+                return j, 0, fav, adv
+            if h >= tp:
+                return j, 1, fav, adv
+        else:
+            fav = max(fav, entry - l)
+            adv = max(adv, h - entry)
+            if h >= sl:
+                return j, 0, fav, adv
+            if l <= tp:
+                return j, 1, fav, adv
+    return n, -1, fav, adv
+
+
+_first_hit_jit = _jit(_first_hit_loop)
+
+
+def first_hit(high, low, start, entry, sl, tp, long):
+    """
+    First bar from `start` on whose range touches the stop or the target, the stop winning
+    when one bar touches both. Returns (bar, hit, mfe, mae): hit is 0 stop, 1 target,
+    -1 none (bar = len), mfe/mae are the largest favourable/adverse excursions from entry
+    up to and including the exit bar, floored at 0.
+    """
+    if _first_hit_jit is not None:
+        j, hit, fav, adv = _first_hit_jit(high, low, int(start), float(entry), float(sl), float(tp), bool(long))
+        return int(j), int(hit), float(fav), float(adv)
+    return _first_hit_np(high, low, start, entry, sl, tp, long)
@@ -1,11 +1,12 @@
 import pandas as pd, numpy as np
 from config import Config
+from strategy import kernels
 from utils.logger import setup_logger
 logger = setup_logger("Liquidity")
 
 class LiquidityAnalyzer:
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, config=None):
+        self.config = config or Config()
         self.th = self.config.LIQUIDITY_THRESHOLD
 
     def find_liquidity_pools(self, df):
@@ -15,50 +16,102 @@ class LiquidityAnalyzer:
         for lv in self._eq_levels(df["low"],tol):
             pools.append({"type":"sell_side_liquidity","level":lv["level"],"strength":lv["touches"],"desc":"EQL"})
         try:
-            daily=df.resample("D").agg({"high":"max","low":"min"}).dropna()
-            if len(daily)>1:
-                pools.append({"type":"buy_side_liquidity","level":daily.iloc[-2]["high"],"strength":5,"desc":"PDH"})
-                pools.append({"type":"sell_side_liquidity","level":daily.iloc[-2]["low"],"strength":5,"desc":"PDL"})
+            pdr=self._prev_day_range(df)
+            if pdr is not None:
+                pools.append({"type":"buy_side_liquidity","level":pdr[0],"strength":5,"desc":"PDH"})
+                pools.append({"type":"sell_side_liquidity","level":pdr[1],"strength":5,"desc":"PDL"})
         except: pass
         return pools
 
+    def _prev_day_range(self, df):
+        """(high, low) of the last complete calendar day with data, like resample("D").iloc[-2]"""
+        idx=df.index
+        if not idx.is_monotonic_increasing:
+            daily=df.resample("D").agg({"high":"max","low":"min"}).dropna()
+            return (daily.iloc[-2]["high"],daily.iloc[-2]["low"]) if len(daily)>1 else None
+        # Sorted index: days are contiguous runs, walk them newest first
+        day=idx.normalize().asi8; hi=df["high"].to_numpy(); lo=df["low"].to_numpy()
+        ends=np.append(np.flatnonzero(day[1:]!=day[:-1])+1,len(day)); found=0
+        for k in range(len(ends)-1,-1,-1):
+            a=ends[k-1] if k else 0; b=ends[k]
+            h=np.fmax.reduce(hi[a:b]); l=np.fmin.reduce(lo[a:b])
+            if h!=h or l!=l: continue
+            found+=1
+            if found==2: return h,l
+        return None
+
     def _eq_levels(self, series, tol):
-        levels=[]; vals=series.values
-        for i in range(len(vals)-1):
-            t=1; s=vals[i]
-            for j in range(i+1,len(vals)):
-                if abs(vals[j]-vals[i])<=tol: t+=1; s+=vals[j]
-            if t>=self.th:
-                avg=s/t
-                if not any(abs(l["level"]-avg)<=tol for l in levels):
-                    levels.append({"level":round(avg,2),"touches":t})
-        return levels
+        vals=series.to_numpy(dtype=float); n=len(vals)
+        if n<2: return []
+        # Same semantics as the pairwise scan: bar i clusters itself with later bars within tol
+        cnt,ctot,ref=self._forward_touches(vals,tol)
+        t=cnt+1
+        cand=np.flatnonzero(t[:-1]>=self.th)
+        lv,tc=kernels.eq_levels(vals,tol,cand,ref+ctot[cand]/t[cand],t)
+        return [{"level":lv[k],"touches":int(tc[k])} for k in range(len(lv))]
+
+    def _forward_touches(self, vals, tol):
+        """
+        For every bar i: how many later bars j>i have |v[j]-v[i]|<=tol, and the sum of v[i] and
+        those v[j] minus (1+count)*min(v). Values are ranked once, the tol window becomes a
+        rank range via searchsorted, and the "later bars only" part is a merge-sort style
+        sweep over doubling index blocks: O(n log^2 n) in NumPy instead of an O(n^2) Python scan.
+        """
+        n=len(vals); order=np.argsort(vals,kind="stable"); sv=vals[order]
+        rank=np.empty(n,np.int64); rank[order]=np.arange(n)
+        lo=np.searchsorted(sv,vals-tol,"left"); hi=np.searchsorted(sv,vals+tol,"right")
+        nan=np.isnan(vals); lo[nan]=hi[nan]=0
+        c=np.where(nan,0.0,vals-sv[0])
+        cnt=np.zeros(n,np.int64); tot=c.copy(); pos=np.arange(n); w=1
+        while w<n:
+            blk=pos//(2*w); right=(pos%(2*w))>=w
+            r=np.flatnonzero(right); l=np.flatnonzero(~right)
+            key=blk[r]*n+rank[r]; o=np.argsort(key,kind="stable"); key=key[o]
+            cs=np.concatenate(([0.0],np.cumsum(c[r][o])))
+            a=np.searchsorted(key,blk[l]*n+lo[l]); b=np.searchsorted(key,blk[l]*n+hi[l])
+            cnt[l]+=b-a; tot[l]+=cs[b]-cs[a]
+            w*=2
+        return cnt,tot,sv[0]
 
-    def detect_liquidity_sweep(self, df):
+    def detect_liquidity_sweep(self, df, window=None):
+        """window: how many recent candles may sweep a pool (SWEEP_LOOKBACK by default)"""
         sweeps=[]; pools=self.find_liquidity_pools(df)
-        for pool in pools:
-            lv=pool["level"]
-            for i in range(-5,0):
-                if abs(i)>=len(df): continue
-                c=df.iloc[i]
-                if pool["type"]=="buy_side_liquidity" and c["high"]>lv and c["close"]<lv and c["close"]<c["open"]:
-                    sweeps.append({"type":"bearish_sweep","level":lv,"timestamp":df.index[i],"desc":pool["desc"]})
-                elif pool["type"]=="sell_side_liquidity" and c["low"]<lv and c["close"]>lv and c["close"]>c["open"]:
-                    sweeps.append({"type":"bullish_sweep","level":lv,"timestamp":df.index[i],"desc":pool["desc"]})
+        window=self.config.SWEEP_LOOKBACK if window is None else window
+        n=len(df); k=min(window,n-1)
+        if not pools or k<=0: return sweeps
+        pos=np.arange(n-k,n)
+        o=df["open"].to_numpy(dtype=float)[pos]; h=df["high"].to_numpy(dtype=float)[pos]
+        l=df["low"].to_numpy(dtype=float)[pos]; c=df["close"].to_numpy(dtype=float)[pos]
+        # pools x candles in one broadcast; nonzero() walks it pool by pool, oldest candle first
+        lv=np.array([p["level"] for p in pools],dtype=float)[:,None]
+        bsl=np.array([p["type"]=="buy_side_liquidity" for p in pools])[:,None]
+        ssl=np.array([p["type"]=="sell_side_liquidity" for p in pools])[:,None]
+        bear=bsl&(h>lv)&(c<lv)&(c<o)
+        bull=ssl&(l<lv)&(c>lv)&(c>o)
+        for r,j in zip(*np.nonzero(bear|bull)):
+            pool=pools[r]
+            sweeps.append({"type":"bearish_sweep" if bear[r,j] else "bullish_sweep","level":pool["level"],"timestamp":df.index[pos[j]],"desc":pool["desc"]})
         return sweeps
 
-    def find_fvg(self, df):
-        fvgs=[]; ms=self.config.FVG_MIN_SIZE
-        for i in range(2,min(50,len(df))):
-            idx=len(df)-1-i
-            if idx<0 or idx+2>=len(df): continue
-            c1=df.iloc[idx]; c3=df.iloc[idx+2]
-            if c3["low"]>c1["high"]:
-                g=c3["low"]-c1["high"]; p=g/c1["high"]
-                if p>=ms and not any(df["low"].iloc[j]<=c1["high"] for j in range(idx+3,len(df))):
-                    fvgs.append({"type":"bullish_fvg","top":c3["low"],"bottom":c1["high"],"midpoint":(c3["low"]+c1["high"])/2,"size_pct":round(p*100,3),"timestamp":df.index[idx+1]})
-            if c3["high"]<c1["low"]:
-                g=c1["low"]-c3["high"]; p=g/c1["low"]
-                if p>=ms and not any(df["high"].iloc[j]>=c1["low"] for j in range(idx+3,len(df))):
-                    fvgs.append({"type":"bearish_fvg","top":c1["low"],"bottom":c3["high"],"midpoint":(c1["low"]+c3["high"])/2,"size_pct":round(p*100,3),"timestamp":df.index[idx+1]})
+    def find_fvg(self, df, lookback=None):
+        """lookback: bars to scan back from the end (FVG_LOOKBACK by default, 0 = whole frame)"""
+        fvgs=[]; ms=self.config.FVG_MIN_SIZE; n=len(df)
+        lookback=self.config.FVG_LOOKBACK if lookback is None else lookback
+        idx=n-1-np.arange(2,min(lookback,n) if lookback else n)
+        if len(idx)==0: return fvgs
+        hi=df["high"].to_numpy(dtype=float); lo=df["low"].to_numpy(dtype=float); ts=df.index
+        # Lowest low / highest high from bar k to the end, so "filled later?" is one lookup
+        lo_after=np.append(np.fmin.accumulate(lo[::-1])[::-1],np.inf)
+        hi_after=np.append(np.fmax.accumulate(hi[::-1])[::-1],-np.inf)
+        h1=hi[idx]; l1=lo[idx]; h3=hi[idx+2]; l3=lo[idx+2]
+        with np.errstate(divide="ignore",invalid="ignore"):
+            pb=(l3-h1)/h1; pr=(l1-h3)/l1
+        bull=(l3>h1)&(pb>=ms)&~(lo_after[idx+3]<=h1)
+        bear=(h3<l1)&(pr>=ms)&~(hi_after[idx+3]>=l1)
+        for k in np.flatnonzero(bull|bear):
+            i=idx[k]
+            if bull[k]:
+                fvgs.append({"type":"bullish_fvg","top":l3[k],"bottom":h1[k],"midpoint":(l3[k]+h1[k])/2,"size_pct":round(pb[k]*100,3),"timestamp":ts[i+1]})
+            if bear[k]:
+                fvgs.append({"type":"bearish_fvg","top":l1[k],"bottom":h3[k],"midpoint":(l1[k]+h3[k])/2,"size_pct":round(pr[k]*100,3),"timestamp":ts[i+1]})
         return fvgs
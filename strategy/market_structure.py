@@ -1,34 +1,63 @@
 import pandas as pd, numpy as np
+from collections import deque
 from config import Config
 from utils.logger import setup_logger
 logger = setup_logger("MarketStructure")
 
 class MarketStructure:
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, config=None):
+        self.config = config or Config()
         self.lb = self.config.SWING_LOOKBACK
+        self._sw_df = None; self._sw_key = None; self._sw = None
+        self._trackers = {}
 
     def find_swing_highs(self, df, lb=None):
-        lb = lb or self.lb
-        sh = pd.Series(index=df.index, dtype=float)
-        for i in range(lb, len(df)-lb):
-            h = df["high"].iloc[i]
-            if all(df["high"].iloc[i-j] < h and df["high"].iloc[i+j] < h for j in range(1, lb+1)):
-                sh.iloc[i] = h
-        return sh.dropna()
+        return self.find_swings(df, lb)[0]
 
     def find_swing_lows(self, df, lb=None):
+        return self.find_swings(df, lb)[1]
+
+    def find_swings(self, df, lb=None):
+        # Memoized on the frame object so detect_structure and get_premium_discount share one pass
         lb = lb or self.lb
-        sl = pd.Series(index=df.index, dtype=float)
-        for i in range(lb, len(df)-lb):
-            l = df["low"].iloc[i]
-            if all(df["low"].iloc[i-j] > l and df["low"].iloc[i+j] > l for j in range(1, lb+1)):
-                sl.iloc[i] = l
-        return sl.dropna()
-
-    def detect_structure(self, df):
-        sh = self.find_swing_highs(df)
-        sl = self.find_swing_lows(df)
+        key = (lb, len(df))
+        if self._sw_df is df and self._sw_key == key:
+            return self._sw
+        sh = self._swing_points(df, "high", lb, np.greater)
+        sl = self._swing_points(df, "low", lb, np.less)
+        self._sw_df, self._sw_key, self._sw = df, key, (sh, sl)
+        return sh, sl
+
+    def _swing_points(self, df, col, lb, beats):
+        v = df[col].to_numpy(dtype=float)
+        n = len(v)
+        if n < 2*lb+1:
+            return pd.Series(index=df.index[:0], dtype=float)
+        # Extreme of each lb-wide window: left neighbours of i are win[i-lb], right ones win[i+1]
+        win = np.lib.stride_tricks.sliding_window_view(v, lb)
+        ext = win.max(axis=1) if beats is np.greater else win.min(axis=1)
+        c = v[lb:n-lb]
+        mask = beats(c, ext[:n-2*lb]) & beats(c, ext[lb+1:])
+        pos = np.flatnonzero(mask) + lb
+        return pd.Series(v[pos], index=df.index[pos], dtype=float)
+
+    def detect_structure(self, df, stream=None, symbol=None):
+        """
+        stream: name of a candle stream (e.g. "entry") to update incrementally instead of rebuilding;
+        trackers are kept per (symbol, stream), so one instance can serve several symbols
+        """
+        if stream is not None and self.config.INCREMENTAL_STRUCTURE and len(df)>0:
+            t = self._sync_tracker((symbol, stream), df)
+            # Only swings df itself confirms (lb candles on each side inside df), as in the
+            # batch pass: older ones the tracker still holds must not depend on how far back it was fed
+            sh, sl = t.swings(); k = self.lb
+            if len(df) <= k: sh, sl = sh.iloc[:0], sl.iloc[:0]
+            else: t0 = df.index[k]; sh, sl = sh.iloc[sh.index.searchsorted(t0):], sl.iloc[sl.index.searchsorted(t0):]
+            return self._from_swings(sh, sl, t.last[4])
+        sh, sl = self.find_swings(df)
+        return self._from_swings(sh, sl, df["close"].iloc[-1] if len(df) else None)
+
+    def _from_swings(self, sh, sl, p):
         s = {"trend":"neutral","swing_highs":sh,"swing_lows":sl,"bos_levels":[],"choch_levels":[],"last_hh":None,"last_ll":None,"strength":0}
         if len(sh)<3 or len(sl)<3:
             return s
@@ -41,7 +70,6 @@ class MarketStructure:
         if bull>=3 and bull>bear: s["trend"]="bullish"; s["strength"]=bull
         elif bear>=3 and bear>bull: s["trend"]="bearish"; s["strength"]=bear
         s["last_hh"]=h[-1]; s["last_ll"]=l[-1]
-        p = df["close"].iloc[-1]
         if len(sh)>=2 and p>sh.iloc[-1]:
             s["bos_levels"].append({"type":"bullish_bos","level":sh.iloc[-1],"timestamp":sh.index[-1]})
         if len(sl)>=2 and p<sl.iloc[-1]:
@@ -53,8 +81,33 @@ class MarketStructure:
                 s["choch_levels"].append({"type":"bearish_choch","level":l[-2],"timestamp":sl.index[-1]})
         return s
 
-    def get_premium_discount(self, df):
-        sh = self.find_swing_highs(df); sl = self.find_swing_lows(df)
+    def _sync_tracker(self, key, df):
+        """
+        Feed the tracker only the candles it has not seen; the newest one is always re-fed (may be forming).
+        The tracker is reused only if its last closed candle (time and OHLC) is in df unchanged,
+        otherwise it is rebuilt from a batch pass over df.
+        """
+        t = self._trackers.get(key); idx = df.index; n = len(df); start = None
+        o, h, l, c = (df[k].to_numpy(dtype=float) for k in ("open", "high", "low", "close"))
+        row = lambda i: (idx[i], o[i], h[i], l[i], c[i])
+        if t is not None and t.lb==self.lb and t.last is not None:
+            p = idx.searchsorted(t.last[0])
+            if p<n and idx[p]==t.last[0]:
+                if t.rollback():
+                    if p>0 and t.last is not None and t.last==row(p-1): start = p
+                elif t.last==row(p): start = p+1
+        if start is None:
+            t = self._trackers[key] = StructureTracker(self.lb)
+            head = df.iloc[:-1]
+            t.seed(head, self._swing_points(head, "high", self.lb, np.greater), self._swing_points(head, "low", self.lb, np.less))
+            start = n-1
+        for i in range(start, n):
+            t.update(idx[i], h[i], l[i], c[i], o[i])
+        return t
+
+    def get_premium_discount(self, df, structure=None):
+        if structure is not None: sh, sl = structure["swing_highs"], structure["swing_lows"]
+        else: sh, sl = self.find_swings(df)
         if len(sh)==0 or len(sl)==0:
             return {"zone":"equilibrium","level":0.5}
         h=sh.iloc[-1]; l=sl.iloc[-1]; c=df["close"].iloc[-1]; r=h-l
@@ -66,3 +119,65 @@ class MarketStructure:
         elif p<0.5: z="slight_discount"
         else: z="equilibrium"
         return {"zone":z,"level":round(p,4),"equilibrium":l+r*0.5,"high":h,"low":l}
+
+
+class StructureTracker:
+    """
+    Incremental market structure for one candle stream.
+    Keeps the last 2*lb+1 candles and the confirmed swings; each update is O(lb).
+    The previous update can be rolled back once, so a still-forming candle can be replaced.
+    """
+
+    def __init__(self, lb, max_swings=500):
+        self.lb = lb
+        self.win = deque(maxlen=2*lb+1)
+        self.sh = deque(maxlen=max_swings); self.sl = deque(maxlen=max_swings)
+        self.last = None; self.dtype = None
+        self._undo = None; self._series = None
+
+    def seed(self, df, sh, sl):
+        """Start from a batch result on df (swings confirmed by df's own candles)"""
+        self.dtype = df.index.dtype
+        self.sh.extend(zip(sh.index, sh.values)); self.sl.extend(zip(sl.index, sl.values))
+        tail = df.iloc[-2*self.lb:] if self.lb>0 else df.iloc[:0]
+        self.win.extend(zip(tail.index, tail["high"].to_numpy(dtype=float), tail["low"].to_numpy(dtype=float), tail["close"].to_numpy(dtype=float)))
+        if len(df): self.last = (df.index[-1], *(float(df[k].iloc[-1]) for k in ("open", "high", "low", "close")))
+        self._undo = None; self._series = None
+
+    def update(self, ts, h, l, c, o=np.nan):
+        w = self.win; lb = self.lb
+        ev = w[0] if len(w)==w.maxlen else None
+        w.append((ts, h, l, c))
+        add_h = add_l = False; ev_h = ev_l = None
+        if len(w)==w.maxlen:
+            cts, ch, cl, _ = w[lb]
+            if all(x[1]<ch for k, x in enumerate(w) if k!=lb):
+                ev_h = self.sh[0] if len(self.sh)==self.sh.maxlen else None
+                self.sh.append((cts, ch)); add_h = True
+            if all(x[2]>cl for k, x in enumerate(w) if k!=lb):
+                ev_l = self.sl[0] if len(self.sl)==self.sl.maxlen else None
+                self.sl.append((cts, cl)); add_l = True
+        self._undo = (ev, self.last, add_h, ev_h, add_l, ev_l)
+        self.last = (ts, o, h, l, c)
+        if add_h or add_l: self._series = None
+
+    def rollback(self):
+        """Undo the most recent update; False if there is nothing to undo"""
+        if self._undo is None: return False
+        ev, last, add_h, ev_h, add_l, ev_l = self._undo
+        self.win.pop()
+        if ev is not None: self.win.appendleft(ev)
+        if add_h:
+            self.sh.pop()
+            if ev_h is not None: self.sh.appendleft(ev_h)
+        if add_l:
+            self.sl.pop()
+            if ev_l is not None: self.sl.appendleft(ev_l)
+        if add_h or add_l: self._series = None
+        self.last = last; self._undo = None
+        return True
+
+    def swings(self):
+        if self._series is None:
+            self._series = tuple(pd.Series([v for _, v in d], index=pd.Index([t for t, _ in d], dtype=self.dtype), dtype=float) for d in (self.sh, self.sl))
+        return self._series
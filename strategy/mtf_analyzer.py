@@ -3,49 +3,72 @@ from config import Config
 from strategy.market_structure import MarketStructure
 from strategy.order_blocks import OrderBlockDetector
 from strategy.liquidity import LiquidityAnalyzer
+from strategy.context import AnalysisContext
+from strategy.indicators import IndicatorEngine
 from utils.logger import setup_logger
+from utils.performance import ResultCache
 logger = setup_logger("MTF")
 
 class MTFAnalyzer:
-    def __init__(self):
-        self.config=Config(); self.ms=MarketStructure(); self.ob=OrderBlockDetector(); self.liq=LiquidityAnalyzer()
+    def __init__(self, ind=None, config=None):
+        self.config=config or Config(); self.ms=MarketStructure(self.config); self.ob=OrderBlockDetector(self.config); self.liq=LiquidityAnalyzer(self.config)
+        self.ind=ind or IndicatorEngine()
+        self.tf_cache=ResultCache(max_size=32)
 
-    def analyze_all_timeframes(self, td):
+    def analyze_all_timeframes(self, td, entry_ctx=None, symbol=None):
+        """entry_ctx: AnalysisContext of the entry frame if the caller already built one
+        symbol: selects the per-symbol detector state and result cache entries"""
         r={"direction_bias":"neutral","structure_trend":"neutral","entry_signal":"NO_SIGNAL","sniper_confirmed":False,"confluence_score":0,"details":{},"final_signal":"NO_SIGNAL","tradeable":False}
-        da=self._direction(td.get("direction")); r["direction_bias"]=da["bias"]; r["details"]["direction"]=da
-        sa=self._structure(td.get("structure")); r["structure_trend"]=sa["trend"]; r["details"]["structure"]=sa
-        ea=self._entry(td.get("entry")); r["entry_signal"]=ea["signal"]; r["details"]["entry"]=ea
-        sn=self._sniper(td.get("sniper")); r["sniper_confirmed"]=sn["confirmed"]; r["details"]["sniper"]=sn
+        da=self._cached("direction",td.get("direction"),symbol,self._direction); r["direction_bias"]=da["bias"]; r["details"]["direction"]=da
+        sa=self._cached("structure",td.get("structure"),symbol,self._structure); r["structure_trend"]=sa["trend"]; r["details"]["structure"]=sa
+        ea=self._entry(td.get("entry"),entry_ctx,symbol); r["entry_signal"]=ea["signal"]; r["details"]["entry"]=ea
+        sn=self._sniper(td.get("sniper"),symbol); r["sniper_confirmed"]=sn["confirmed"]; r["details"]["sniper"]=sn
         r["confluence_score"]=self._confluence(da,sa,ea,sn)
         f=self._final(da,sa,ea,sn,r["confluence_score"])
         r.update({"final_signal":f["signal"],"tradeable":f["tradeable"],"direction":f.get("direction"),"entry_price":f.get("entry"),"stop_loss":f.get("stop_loss"),"take_profit":f.get("take_profit"),"confidence":f.get("confidence",0)})
         logger.info(f"MTF | Dir:{r['direction_bias']} Str:{r['structure_trend']} Ent:{r['entry_signal']} Snp:{'Y' if r['sniper_confirmed'] else 'N'} Score:{r['confluence_score']}/10")
         return r
 
-    def _direction(self, df):
+    def _cached(self, layer, df, symbol, fn):
+        """
+        Direction/structure results only move with the candles of their timeframe. Keyed on the
+        symbol, the last two rows (the last closed candle and the forming one, timestamps and
+        OHLCV), the frame length and the detector settings: the forming candle is part of the
+        analysis, so any tick of it is a miss. Hits come from calls that see the same HTF frame,
+        e.g. replays, where HTF frames hold closed candles only.
+        """
+        if not self.config.MTF_CACHE or df is None or len(df)<30: return fn(df,symbol)
+        rows=tuple((df.index[i],*(df[k].iloc[i] for k in ("open","high","low","close","volume"))) for i in (-2,-1))
+        key=(symbol,layer,getattr(self.config,f"TF_{layer.upper()}"),rows,len(df),self.ms.lb,self.ob.lookback,self.liq.config.FVG_MIN_SIZE,self.liq.config.FVG_LOOKBACK)
+        a=self.tf_cache.get(key)
+        if a is None: a=fn(df,symbol); self.tf_cache.set(key,a)
+        return a
+
+    def _direction(self, df, symbol=None):
         a={"bias":"neutral","strength":0,"key_levels":{}}
         if df is None or len(df)<30: return a
-        s=self.ms.detect_structure(df); pz=self.ms.get_premium_discount(df)
+        s=self.ms.detect_structure(df,stream="direction",symbol=symbol); pz=self.ms.get_premium_discount(df,s)
         a["bias"]=s["trend"]; a["strength"]=s["strength"]; a["key_levels"]={"zone":pz["zone"]}
         for b in s["bos_levels"]:
             if b["type"]=="bullish_bos": a["bias"]="strong_bullish"; a["strength"]+=2
             elif b["type"]=="bearish_bos": a["bias"]="strong_bearish"; a["strength"]+=2
         return a
 
-    def _structure(self, df):
+    def _structure(self, df, symbol=None):
         a={"trend":"neutral","strength":0,"order_blocks":[],"bos":[],"choch":[],"fvgs":[],"key_level":None}
         if df is None or len(df)<30: return a
-        s=self.ms.detect_structure(df); obs=self.ob.find_order_blocks(df); fvgs=self.liq.find_fvg(df)
+        s=self.ms.detect_structure(df,stream="structure",symbol=symbol); obs=self.ob.find_order_blocks(df,symbol=symbol); fvgs=self.liq.find_fvg(df)
         a.update({"trend":s["trend"],"strength":s["strength"],"order_blocks":obs[:5],"bos":s["bos_levels"],"choch":s["choch_levels"],"fvgs":fvgs[:5]})
         if obs:
             p=df["close"].iloc[-1]; a["key_level"]=min(obs,key=lambda o:abs(p-o["midpoint"]))
         return a
 
-    def _entry(self, df):
+    def _entry(self, df, ctx=None, symbol=None):
         a={"signal":"NO_SIGNAL","direction":None,"entry":None,"stop_loss":None,"take_profit":None,"confidence":0,"trigger":[]}
         if df is None or len(df)<30: return a
-        s=self.ms.detect_structure(df); obs=self.ob.find_order_blocks(df); sw=self.liq.detect_liquidity_sweep(df); fvgs=self.liq.find_fvg(df); pz=self.ms.get_premium_discount(df)
-        p=df["close"].iloc[-1]; atr=self._atr(df); rr=self.config.RISK_REWARD_RATIO
+        if ctx is None or ctx.df is not df: ctx=AnalysisContext(df,None,self.ms,self.ob,self.liq,self.ind,symbol=symbol)
+        s=ctx.structure; obs=ctx.order_blocks; sw=ctx.sweeps; fvgs=ctx.fvgs; pz=ctx.premium_discount
+        p=df["close"].iloc[-1]; atr=ctx.atr; rr=self.config.RISK_REWARD_RATIO
         bt=0; br=[]; st=0; sr=[]
         for b in s["bos_levels"]:
             if b["type"]=="bullish_bos": bt+=2; br.append("BOS")
@@ -77,15 +100,14 @@ class MTFAnalyzer:
             a.update({"signal":"STRONG_SELL" if st>=6 else "SELL","direction":"short","confidence":min(st/8,1.0),"trigger":sr,"entry":p,"stop_loss":sl,"take_profit":p-abs(sl-p)*rr})
         return a
 
-    def _sniper(self, df):
+    def _sniper(self, df, symbol=None):
         a={"confirmed":False,"momentum":"neutral","volume_confirm":False}
         if df is None or len(df)<20: return a
-        s=self.ms.detect_structure(df)
-        delta=df["close"].diff(); g=delta.where(delta>0,0).rolling(14).mean().iloc[-1]; l=(-delta.where(delta<0,0)).rolling(14).mean().iloc[-1]
-        rsi=100-(100/(1+g/max(l,1e-10)))
+        s=self.ms.detect_structure(df,stream="sniper",symbol=symbol)
+        ind=self.ind.snapshot(df,"sniper",symbol); rsi=ind["rsi"]
         if rsi>55: a["momentum"]="bullish"
         elif rsi<45: a["momentum"]="bearish"
-        va=df["volume"].rolling(20).mean().iloc[-1]; a["volume_confirm"]=df["volume"].iloc[-1]>va*1.2
+        va=ind["vol_sma"]; a["volume_confirm"]=df["volume"].iloc[-1]>va*1.2
         last3=df.tail(3); bc=sum(1 for _,c in last3.iterrows() if c["close"]>c["open"])
         if bc>=2 and a["momentum"]=="bullish": a["confirmed"]=True; a["direction"]="bullish"
         elif bc<=1 and a["momentum"]=="bearish": a["confirmed"]=True; a["direction"]="bearish"
@@ -118,8 +140,3 @@ class MTFAnalyzer:
         if st==ed.replace("long","bullish").replace("short","bearish"): conf*=1.1
         if sn["confirmed"]: conf*=1.1
         return {"signal":e["signal"],"tradeable":True,"direction":ed,"entry":e.get("entry"),"stop_loss":e.get("stop_loss"),"take_profit":e.get("take_profit"),"confidence":min(round(conf,3),1.0)}
-
-    def _atr(self,df,p=14):
-        h,l,c=df["high"],df["low"],df["close"]
-        tr=pd.concat([h-l,abs(h-c.shift(1)),abs(l-c.shift(1))],axis=1).max(axis=1)
-        return tr.rolling(p).mean().iloc[-1]
@@ -3,6 +3,8 @@ import numpy as np
 from typing import List, Dict, Optional
 from config import Config
 from utils.logger import setup_logger
+from utils.performance import ResultCache
+from strategy import kernels
 logger = setup_logger("OrderBlocks")
 
 
@@ -19,29 +21,29 @@ class OrderBlockDetector:
     - Volume Profile Lite for supply/demand zones
     """
 
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, config=None):
+        self.config = config or Config()
         self.lookback = self.config.OB_LOOKBACK
+        self.htf_cache = ResultCache()  # HTF contexts, keyed in htf_context()
 
-    def find_order_blocks(self, df, htf_df=None):
-        """شناسایی OB با امتیازدهی پیشرفته"""
-        raw_obs = []
-
-        for i in range(2, min(self.lookback, len(df) - 3)):
-            idx = len(df) - 1 - i
-
-            bull = self._check_bullish_ob(df, idx)
-            if bull:
-                raw_obs.append(bull)
+    def find_order_blocks(self, df, htf_df=None, symbol=None, htf_ctx=None):
+        """
+        شناسایی OB با امتیازدهی پیشرفته (symbol: owner of htf_df, for the HTF context cache;
+        htf_ctx: htf_context(htf_df) if the caller already has it)
+        """
+        raw_obs = self._scan_order_blocks(df, self.lookback)
+        self._touch_status_batch(df, raw_obs)
 
-            bear = self._check_bearish_ob(df, idx)
-            if bear:
-                raw_obs.append(bear)
+        # Looked up once for all OBs: price, highs / lows and the HTF context
+        price = df["close"].iloc[-1]
+        hl = (df["high"].to_numpy(dtype=float), df["low"].to_numpy(dtype=float))
+        if htf_ctx is None and raw_obs and htf_df is not None and len(htf_df) >= 10:
+            htf_ctx = self.htf_context(htf_df, symbol)
 
         # Score each OB
         scored = []
         for ob in raw_obs:
-            ob = self._score_ob(df, ob, htf_df)
+            ob = self._score_ob(df, ob, htf_df, symbol, htf_ctx, price, hl)
             if ob["total_score"] > 0:
                 scored.append(ob)
 
@@ -50,131 +52,110 @@ class OrderBlockDetector:
         logger.debug(f"Found {len(scored)} scored OBs")
         return scored[:15]
 
-    def _check_bullish_ob(self, df, idx):
-        """Bullish OB Detection"""
-        if idx + 3 >= len(df) or idx < 0:
-            return None
-
-        c = df.iloc[idx]
-        n1 = df.iloc[idx + 1]
-        n2 = df.iloc[idx + 2]
-
-        # Must be bearish candle
-        if c["close"] >= c["open"]:
-            return None
-
-        rng = c["high"] - c["low"]
-        if rng == 0:
-            return None
-
-        # Strong bullish move after
-        move = n2["close"] - c["low"]
-        if move < rng * 1.5:
-            return None
-
-        # Next candles must be bullish
-        if not (n1["close"] > n1["open"] and n2["close"] > n2["open"]):
-            return None
-
-        # Check for FVG (gap between candle1 high and candle3 low)
-        has_fvg = n2["low"] > c["high"]
-        fvg_size = 0
-        if has_fvg:
-            fvg_size = (n2["low"] - c["high"]) / c["high"] * 100
-
-        # Body percentage (how much of candle is body vs wick)
-        body = abs(c["open"] - c["close"])
-        body_pct = body / rng if rng > 0 else 0
-
-        # Volume spike
-        avg_vol = df["volume"].iloc[max(0, idx-20):idx].mean()
-        vol_ratio = c["volume"] / avg_vol if avg_vol > 0 else 1
-
-        return {
-            "type": "bullish_ob",
-            "top": max(c["open"], c["close"]),
-            "bottom": c["low"],
-            "midpoint": (max(c["open"], c["close"]) + c["low"]) / 2,
-            "timestamp": df.index[idx],
-            "candle_idx": idx,
-            "volume": c["volume"],
-            "vol_ratio": round(vol_ratio, 2),
-            "has_fvg": has_fvg,
-            "fvg_size": round(fvg_size, 3),
-            "body_pct": round(body_pct, 2),
-            "move_strength": round(move / rng, 2),
-            "mitigated": False,
-            "touch_count": 0,
-            "is_fresh": True,
-            "has_liquidity_ahead": False,
-            "in_htf_zone": False,
-            "total_score": 0,
-        }
-
-    def _check_bearish_ob(self, df, idx):
-        """Bearish OB Detection"""
-        if idx + 3 >= len(df) or idx < 0:
-            return None
-
-        c = df.iloc[idx]
-        n1 = df.iloc[idx + 1]
-        n2 = df.iloc[idx + 2]
-
-        if c["close"] <= c["open"]:
-            return None
-
-        rng = c["high"] - c["low"]
-        if rng == 0:
-            return None
-
-        move = c["high"] - n2["close"]
-        if move < rng * 1.5:
-            return None
-
-        if not (n1["close"] < n1["open"] and n2["close"] < n2["open"]):
-            return None
-
-        has_fvg = n2["high"] < c["low"]
-        fvg_size = 0
-        if has_fvg:
-            fvg_size = (c["low"] - n2["high"]) / c["low"] * 100
-
-        body = abs(c["close"] - c["open"])
-        body_pct = body / rng if rng > 0 else 0
-
-        avg_vol = df["volume"].iloc[max(0, idx-20):idx].mean()
-        vol_ratio = c["volume"] / avg_vol if avg_vol > 0 else 1
-
-        return {
-            "type": "bearish_ob",
-            "top": c["high"],
-            "bottom": min(c["open"], c["close"]),
-            "midpoint": (c["high"] + min(c["open"], c["close"])) / 2,
-            "timestamp": df.index[idx],
-            "candle_idx": idx,
-            "volume": c["volume"],
-            "vol_ratio": round(vol_ratio, 2),
-            "has_fvg": has_fvg,
-            "fvg_size": round(fvg_size, 3),
-            "body_pct": round(body_pct, 2),
-            "move_strength": round(move / rng, 2),
-            "mitigated": False,
-            "touch_count": 0,
-            "is_fresh": True,
-            "has_liquidity_ahead": False,
-            "in_htf_zone": False,
-            "total_score": 0,
-        }
-
-    def _score_ob(self, df, ob, htf_df=None):
+    def _scan_order_blocks(self, df, lookback):
+        """
+        Bullish + Bearish OB candidates in one vectorized pass
+
+        Candle idx is an OB when (bullish case, bearish mirrors it):
+        - idx is a bearish candle with a non-zero range
+        - idx+1 and idx+2 are bullish
+        - close of idx+2 is at least 1.5x the OB range above its low
+        Returned newest first, same order as scanning idx backwards.
+        """
+        n = len(df)
+        # idx = n-1-i for i in [2, lookback); idx+3 must still be inside the frame
+        idx = np.arange(n - 4, n - 1 - min(lookback, n - 3), -1)
+        if len(idx) == 0:
+            return []
+
+        o = df["open"].to_numpy(dtype=float)
+        h = df["high"].to_numpy(dtype=float)
+        l = df["low"].to_numpy(dtype=float)
+        c = df["close"].to_numpy(dtype=float)
+        v = df["volume"].to_numpy(dtype=float)
+
+        co, ch, cl, cc = o[idx], h[idx], l[idx], c[idx]
+        n1_up = c[idx + 1] > o[idx + 1]
+        n2_up = c[idx + 2] > o[idx + 2]
+        n1_down = c[idx + 1] < o[idx + 1]
+        n2_down = c[idx + 2] < o[idx + 2]
+        rng = ch - cl
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bull_move = c[idx + 2] - cl
+            bear_move = ch - c[idx + 2]
+            bull = ~(cc >= co) & (rng != 0) & ~(bull_move < rng * 1.5) & n1_up & n2_up
+            bear = ~(cc <= co) & (rng != 0) & ~(bear_move < rng * 1.5) & n1_down & n2_down
+
+        hits = np.flatnonzero(bull | bear)
+        if len(hits) == 0:
+            return []
+
+        avg_vol = self._prior_volume_mean(v, 20)
+        obs = []
+        for k in hits:
+            i = int(idx[k])
+            r = rng[k]
+            body_pct = abs(co[k] - cc[k]) / r if r > 0 else 0
+            vol_ratio = v[i] / avg_vol[i] if avg_vol[i] > 0 else 1
+
+            if bull[k]:
+                # Check for FVG (gap between candle1 high and candle3 low)
+                n2_low = l[i + 2]
+                has_fvg = n2_low > ch[k]
+                fvg_size = (n2_low - ch[k]) / ch[k] * 100 if has_fvg else 0
+                top = cc[k] if cc[k] > co[k] else co[k]
+                bottom = cl[k]
+                move = bull_move[k]
+                ob_type = "bullish_ob"
+            else:
+                n2_high = h[i + 2]
+                has_fvg = n2_high < cl[k]
+                fvg_size = (cl[k] - n2_high) / cl[k] * 100 if has_fvg else 0
+                top = ch[k]
+                bottom = cc[k] if cc[k] < co[k] else co[k]
+                move = bear_move[k]
+                ob_type = "bearish_ob"
+
+            obs.append({
+                "type": ob_type,
+                "top": top,
+                "bottom": bottom,
+                "midpoint": (top + bottom) / 2,
+                "timestamp": df.index[i],
+                "candle_idx": i,
+                "volume": v[i],
+                "vol_ratio": round(vol_ratio, 2),
+                "has_fvg": has_fvg,
+                "fvg_size": round(fvg_size, 3),
+                "body_pct": round(body_pct, 2),
+                "move_strength": round(move / r, 2),
+                "mitigated": False,
+                "touch_count": 0,
+                "is_fresh": True,
+                "has_liquidity_ahead": False,
+                "in_htf_zone": False,
+                "total_score": 0,
+            })
+        return obs
+
+    def _prior_volume_mean(self, vol, window):
+        """Mean volume of the `window` candles before each index (NaN for index 0)"""
+        n = len(vol)
+        avg = np.full(n, np.nan)
+        if n > window:
+            avg[window:] = np.lib.stride_tricks.sliding_window_view(vol[:-1], window).mean(axis=1)
+        for i in range(1, min(window, n - 1) + 1):
+            avg[i] = vol[:i].mean()
+        return avg
+
+    def _score_ob(self, df, ob, htf_df=None, symbol=None, htf_ctx=None, price=None, hl=None):
         """امتیازدهی جامع به OB"""
         score = 0
-        price = df["close"].iloc[-1]
+        price = df["close"].iloc[-1] if price is None else price
         reasons = []
 
-        # ── 1. Check mitigated/fresh/tested ──
-        ob = self._check_touch_status(df, ob)
-
+        # ── 1. Mitigated/fresh/tested (set by _touch_status_batch) ──
         if ob["mitigated"]:
             ob["total_score"] = 0
             return ob
@@ -225,7 +206,7 @@ class OrderBlockDetector:
             score += 0.5
 
         # ── 7. Clean OB (no liquidity ahead) = +2 ──
-        ob["has_liquidity_ahead"] = self._check_liquidity_ahead(df, ob)
+        ob["has_liquidity_ahead"] = self._check_liquidity_ahead(df, ob, price, hl)
         if not ob["has_liquidity_ahead"]:
             score += 2
             reasons.append("Clean(+2)")
@@ -248,7 +229,7 @@ class OrderBlockDetector:
 
         # ── 9. HTF Zone alignment = +2 ──
         if htf_df is not None:
-            ob["in_htf_zone"] = self._check_htf_alignment(ob, htf_df)
+            ob["in_htf_zone"] = self._check_htf_alignment(ob, htf_df, symbol, htf_ctx)
             if ob["in_htf_zone"]:
                 score += 2
                 reasons.append("HTF_Zone(+2)")
@@ -265,80 +246,84 @@ class OrderBlockDetector:
 
     def _check_touch_status(self, df, ob):
         """بررسی Fresh / Tested / Mitigated"""
-        try:
-            ob_idx = df.index.get_loc(ob["timestamp"])
-        except:
-            ob["mitigated"] = True
-            return ob
-
-        touch_count = 0
-        mitigated = False
-
-        for j in range(ob_idx + 3, len(df)):
-            if ob["type"] == "bullish_ob":
-                # Price entered OB zone
-                if df["low"].iloc[j] <= ob["top"] and df["low"].iloc[j] >= ob["bottom"]:
-                    touch_count += 1
-                # Price broke through
-                if df["close"].iloc[j] < ob["bottom"]:
-                    mitigated = True
-                    break
-            elif ob["type"] == "bearish_ob":
-                if df["high"].iloc[j] >= ob["bottom"] and df["high"].iloc[j] <= ob["top"]:
-                    touch_count += 1
-                if df["close"].iloc[j] > ob["top"]:
-                    mitigated = True
-                    break
-
-        ob["touch_count"] = touch_count
-        ob["is_fresh"] = touch_count == 0
-        ob["mitigated"] = mitigated
+        self._touch_status_batch(df, [ob])
         return ob
 
-    def _check_liquidity_ahead(self, df, ob):
-        """آیا نقدینگی (Equal Highs/Lows) جلوی OB هست؟"""
-        price = df["close"].iloc[-1]
+    def _touch_status_batch(self, df, obs):
+        """
+        Fresh / Tested / Mitigated for all OBs at once
+
+        Each OB is checked from candle_idx+3 onwards: a touch is a wick into the zone,
+        mitigation is the first close through the far side. Touches are counted up to
+        and including the mitigation candle. The scan itself is kernels.touch_status.
+        """
+        if not obs:
+            return obs
+
+        n = len(df)
+        starts, missing = [], []
+        for ob in obs:
+            idx = ob.get("candle_idx")
+            if idx is None:
+                try:
+                    idx = df.index.get_loc(ob["timestamp"])
+                except:
+                    idx = None
+            missing.append(idx is None)
+            starts.append(n if idx is None else idx + 3)
+        touches, mitigated = kernels.touch_status(
+            df["low"].to_numpy(dtype=float), df["high"].to_numpy(dtype=float),
+            df["close"].to_numpy(dtype=float), np.array(starts),
+            np.array([ob["top"] for ob in obs], dtype=float),
+            np.array([ob["bottom"] for ob in obs], dtype=float),
+            np.array([ob["type"] == "bullish_ob" for ob in obs]))
+
+        for k, ob in enumerate(obs):
+            if missing[k]:
+                ob["mitigated"] = True
+                continue
+            ob["touch_count"] = int(touches[k])
+            ob["is_fresh"] = ob["touch_count"] == 0
+            ob["mitigated"] = bool(mitigated[k])
+        return obs
+
+    def _check_liquidity_ahead(self, df, ob, price=None, hl=None):
+        """آیا نقدینگی (Equal Highs/Lows) جلوی OB هست؟ (hl: df's highs / lows as arrays)"""
+        price = df["close"].iloc[-1] if price is None else price
         tolerance = price * 0.002
 
         if ob["type"] == "bullish_ob":
             # Check for equal lows between price and OB
-            zone_low = ob["bottom"]
-            zone_high = price
-            lows_in_zone = df["low"][(df["low"] >= zone_low) & (df["low"] <= zone_high)]
-
-            if len(lows_in_zone) < 3:
-                return False
-
-            # Check for clusters
-            for i in range(len(lows_in_zone)):
-                count = sum(1 for l in lows_in_zone if abs(l - lows_in_zone.iloc[i]) <= tolerance)
-                if count >= 3:
-                    return True  # Liquidity pool found
+            lows = df["low"].to_numpy(dtype=float) if hl is None else hl[1]
+            in_zone = lows[(lows >= ob["bottom"]) & (lows <= price)]
+            return self._has_cluster(in_zone, tolerance)
 
         elif ob["type"] == "bearish_ob":
-            zone_low = price
-            zone_high = ob["top"]
-            highs_in_zone = df["high"][(df["high"] >= zone_low) & (df["high"] <= zone_high)]
-
-            if len(highs_in_zone) < 3:
-                return False
-
-            for i in range(len(highs_in_zone)):
-                count = sum(1 for h in highs_in_zone if abs(h - highs_in_zone.iloc[i]) <= tolerance)
-                if count >= 3:
-                    return True
+            highs = df["high"].to_numpy(dtype=float) if hl is None else hl[0]
+            in_zone = highs[(highs >= price) & (highs <= ob["top"])]
+            return self._has_cluster(in_zone, tolerance)
 
         return False
 
-    def _check_htf_alignment(self, ob, htf_df):
+    def _has_cluster(self, values, tolerance, min_touches=3):
+        """Is any value within tolerance of at least min_touches values (itself included)?"""
+        if len(values) < min_touches:
+            return False
+        # Sorted: the values within tolerance of v[k] are one contiguous run
+        v = np.sort(values)
+        count = np.searchsorted(v, v + tolerance, "right") - np.searchsorted(v, v - tolerance, "left")
+        return bool((count >= min_touches).any())
+
+    def _check_htf_alignment(self, ob, htf_df, symbol=None, ctx=None):
         """آیا OB در ناحیه عرضه/تقاضا تایم بالا هست؟"""
         if htf_df is None or len(htf_df) < 10:
             return False
 
         # Find HTF supply/demand using volume profile lite
-        vp = self.volume_profile_lite(htf_df)
+        if ctx is None:
+            ctx = self.htf_context(htf_df, symbol)
 
-        for zone in vp:
+        for zone in ctx["vp_zones"]:
             if ob["type"] == "bullish_ob" and zone["type"] == "demand":
                 if zone["low"] <= ob["midpoint"] <= zone["high"]:
                     return True
@@ -347,17 +332,7 @@ class OrderBlockDetector:
                     return True
 
         # Also check HTF OBs
-        htf_obs = []
-        for i in range(2, min(30, len(htf_df) - 3)):
-            idx = len(htf_df) - 1 - i
-            bull = self._check_bullish_ob(htf_df, idx)
-            if bull:
-                htf_obs.append(bull)
-            bear = self._check_bearish_ob(htf_df, idx)
-            if bear:
-                htf_obs.append(bear)
-
-        for htf_ob in htf_obs:
+        for htf_ob in ctx["order_blocks"]:
             if (ob["type"] == "bullish_ob" and htf_ob["type"] == "bullish_ob"):
                 if htf_ob["bottom"] <= ob["midpoint"] <= htf_ob["top"]:
                     return True
@@ -367,12 +342,35 @@ class OrderBlockDetector:
 
         return False
 
-    def volume_profile_lite(self, df, num_levels=20):
+    def htf_context(self, htf_df, symbol=None):
+        """
+        HTF volume-profile zones + raw HTF OBs, cached per HTF frame
+
+        Reused for every OB of a call, across get_best_ob calls and across cycles while
+        the HTF frame is unchanged. The key holds the symbol and the newest HTF row's
+        OHLCV, so a live frame whose forming candle moves gets fresh zones.
+        """
+        last = tuple(htf_df[k].iloc[-1] for k in ("open", "high", "low", "close", "volume")) if len(htf_df) else None
+        key = (symbol, len(htf_df), htf_df.index[-1] if len(htf_df) else None, last, self.config.VP_LEVELS)
+        ctx = self.htf_cache.get(key)
+        if ctx is None:
+            ctx = {
+                "vp_zones": self.volume_profile_lite(htf_df),
+                "order_blocks": self._scan_order_blocks(htf_df, 30),
+            }
+            self.htf_cache.set(key, ctx)
+        return ctx
+
+    def volume_profile_lite(self, df, num_levels=None):
         """
         Volume Profile ساده
         بدون tick data - از candle volume استفاده میکنه
         سبک و سریع برای گوشی
+
+        num_levels defaults to VP_LEVELS; a few hundred levels cost about the same as 20
+        since the whole candles x levels overlap is one NumPy matrix.
         """
+        num_levels = num_levels or self.config.VP_LEVELS
         if len(df) < 10:
             return []
 
@@ -384,43 +382,42 @@ class OrderBlockDetector:
             return []
 
         level_size = price_range / num_levels
-        levels = []
+        level_low = price_low + (np.arange(num_levels) * level_size)
+        level_high = level_low + level_size
+        level_mid = (level_low + level_high) / 2
+
+        # candles (rows) x levels (columns)
+        low = df["low"].to_numpy(dtype=float)[:, None]
+        high = df["high"].to_numpy(dtype=float)[:, None]
+        vol = df["volume"].to_numpy(dtype=float)[:, None]
+        candle_range = high - low
+        at_level = (low <= level_high) & (high >= level_low) & (candle_range > 0)
+
+        # Portion of candle in each level
+        with np.errstate(divide="ignore", invalid="ignore"):
+            overlap = np.maximum(0, np.minimum(high, level_high) - np.maximum(low, level_low))
+            part = np.where(at_level, vol * (overlap / candle_range), 0.0)
+
+        # cumsum adds candle by candle, same float result as accumulating in a loop
+        vol_at_level = np.cumsum(part, axis=0)[-1]
+        candles_at_level = at_level.sum(axis=0)
 
+        levels = []
         for i in range(num_levels):
-            level_low = price_low + (i * level_size)
-            level_high = level_low + level_size
-            level_mid = (level_low + level_high) / 2
-
-            # Calculate volume at this level
-            vol_at_level = 0
-            candles_at_level = 0
-
-            for _, candle in df.iterrows():
-                if candle["low"] <= level_high and candle["high"] >= level_low:
-                    # Portion of candle in this level
-                    candle_range = candle["high"] - candle["low"]
-                    if candle_range > 0:
-                        overlap_low = max(candle["low"], level_low)
-                        overlap_high = min(candle["high"], level_high)
-                        overlap = max(0, overlap_high - overlap_low)
-                        portion = overlap / candle_range
-                        vol_at_level += candle["volume"] * portion
-                        candles_at_level += 1
-
             levels.append({
-                "low": round(level_low, 2),
-                "high": round(level_high, 2),
-                "mid": round(level_mid, 2),
-                "volume": round(vol_at_level, 2),
-                "candles": candles_at_level,
+                "low": round(level_low[i], 2),
+                "high": round(level_high[i], 2),
+                "mid": round(level_mid[i], 2),
+                "volume": round(vol_at_level[i], 2),
+                "candles": int(candles_at_level[i]),
             })
 
         # Find POC (Point of Control)
         if not levels:
             return []
 
-        max_vol = max(l["volume"] for l in levels)
         avg_vol = sum(l["volume"] for l in levels) / len(levels)
+        poc = max(levels, key=lambda x: x["volume"])
 
         # Classify zones
         zones = []
@@ -436,7 +433,6 @@ class OrderBlockDetector:
 
             # Determine supply/demand
             # Below POC = demand, Above POC = supply
-            poc = max(levels, key=lambda x: x["volume"])
             if level["mid"] < poc["mid"]:
                 sd_type = "demand"
             else:
@@ -455,9 +451,10 @@ class OrderBlockDetector:
 
         return zones
 
-    def get_best_ob(self, df, direction, htf_df=None):
-        """بهترین OB برای یک جهت خاص"""
-        obs = self.find_order_blocks(df, htf_df)
+    def get_best_ob(self, df, direction, htf_df=None, obs=None, symbol=None):
+        """بهترین OB برای یک جهت خاص (obs: already scored OBs of df, to skip re-detection)"""
+        if obs is None:
+            obs = self.find_order_blocks(df, htf_df, symbol)
 
         if direction == "long":
             bull_obs = [ob for ob in obs if ob["type"] == "bullish_ob"]
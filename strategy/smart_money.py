@@ -7,6 +7,9 @@ from strategy.market_structure import MarketStructure
 from strategy.order_blocks import OrderBlockDetector
 from strategy.liquidity import LiquidityAnalyzer
 from strategy.mtf_analyzer import MTFAnalyzer
+from strategy.context import AnalysisContext
+from strategy import indicators
+from strategy.alignment import AsOfFrames, bar_period
 from utils.logger import setup_logger
 logger = setup_logger("SmartMoney")
 
@@ -14,14 +17,19 @@ logger = setup_logger("SmartMoney")
 class SmartMoneyStrategy:
     """Smart Money Strategy - Pro Version with all enhancements"""
 
-    def __init__(self):
-        self.config = Config()
-        self.ms = MarketStructure()
-        self.ob = OrderBlockDetector()
-        self.liq = LiquidityAnalyzer()
-        self.mtf = MTFAnalyzer()
-
-    def analyze(self, df, htf_df=None, direction_df=None, sniper_df=None):
+    def __init__(self, config=None):
+        # config: settings for the strategy and all its detectors (default: from the environment);
+        # lookbacks are read at construction, so pass it here rather than assigning .config later
+        self.config = config or Config()
+        self.ms = MarketStructure(self.config)
+        self.ob = OrderBlockDetector(self.config)
+        self.liq = LiquidityAnalyzer(self.config)
+        self.ind = indicators.IndicatorEngine()
+        self.mtf = MTFAnalyzer(ind=self.ind, config=self.config)
+
+    def analyze(self, df, htf_df=None, direction_df=None, sniper_df=None, symbol=None, now=None):
+        # now: UTC time the kill zone is rated at; the wall clock by default (live), the
+        # bar's close time when replaying history, so signals depend only on the data
         result = {
             "signal": "NO_SIGNAL", "direction": None, "confidence": 0,
             "entry": None, "stop_loss": None, "take_profit": None,
@@ -32,21 +40,63 @@ class SmartMoneyStrategy:
             return result
 
         if direction_df is not None or sniper_df is not None:
-            return self._mtf_analyze(df, htf_df, direction_df, sniper_df)
-
-        return self._legacy_analyze(df, htf_df)
-
-    def _mtf_analyze(self, entry_df, structure_df, direction_df, sniper_df):
+            return self._mtf_analyze(df, htf_df, direction_df, sniper_df, symbol, now)
+
+        return self._legacy_analyze(df, htf_df, symbol, now)
+
+    def analyze_series(self, df, htf_df=None, bars=None, direction_df=None, sniper_df=None,
+                       window=None, htf_window=None, symbol=None, progress=None):
+        """
+        Per-bar signal table
+
+        Row i is analyze(<last `window` candles up to bar i>, <last `htf_window` HTF
+        candles closed when bar i closes>), with no HTF frame until the first one closes:
+        only data available at bar i is used. window / htf_window default to BT_WINDOW /
+        BT_HTF_WINDOW (the live fetch sizes) and keep each call's cost independent of the
+        bar's position; 0 analyzes the whole history. `bars` limits the table to those
+        positions. direction_df / sniper_df are aligned the same way and select the
+        multi-timeframe path, as in analyze(). The kill zone is rated at bar i's close
+        time, not the wall clock. Windows are views, not copies.
+
+        Columns: the signal fields, tp_base / tp_risk (analyze()'s "target_base", NaN
+        without one) and the features. A bar whose analysis raises is logged and left out.
+        progress(done, total) is called after every bar.
+        """
+        cols = ["signal", "direction", "confidence", "entry", "stop_loss", "take_profit", "tp_base", "tp_risk"]
+        w = self.config.BT_WINDOW if window is None else window
+        hw = self.config.BT_HTF_WINDOW if htf_window is None else htf_window
+        pos = range(len(df)) if bars is None else sorted(bars)
+        aux = AsOfFrames(df.index, {"htf_df": htf_df, "direction_df": direction_df, "sniper_df": sniper_df}, hw)
+        closes = df.index + bar_period(df.index)
+        rows, kept = [], []
+        for k, i in enumerate(pos, 1):
+            try:
+                a = self.analyze(df.iloc[max(0, i + 1 - w) if w else 0:i + 1], symbol=symbol, now=closes[i], **aux.at(i))
+            except Exception as e:
+                logger.error(f"Analyze {df.index[i]}: {e}")
+            else:
+                row = {c: a[c] for c in cols[:6]}
+                row["tp_base"], row["tp_risk"] = a.get("target_base", (np.nan, np.nan))
+                row.update(a["features"])
+                rows.append(row)
+                kept.append(i)
+            if progress:
+                progress(k, len(pos))
+        return pd.DataFrame.from_records(rows, index=df.index[kept], columns=None if rows else cols)
+
+    def _mtf_analyze(self, entry_df, structure_df, direction_df, sniper_df, symbol=None, now=None):
         tf_data = {
             "direction": direction_df,
             "structure": structure_df,
             "entry": entry_df,
             "sniper": sniper_df,
         }
-        mtf_result = self.mtf.analyze_all_timeframes(tf_data)
+        # The entry frame is analyzed once and shared with the MTF entry timeframe
+        ctx = AnalysisContext(entry_df, None, self.ms, self.ob, self.liq, self.ind, symbol=symbol)
+        mtf_result = self.mtf.analyze_all_timeframes(tf_data, entry_ctx=ctx, symbol=symbol)
         features = self._extract_features(entry_df,
-            self.ms.detect_structure(entry_df), "neutral",
-            None, [], [], {"zone": "equilibrium"}, 0, 0)
+            ctx.structure, "neutral",
+            None, [], [], {"zone": "equilibrium"}, 0, 0, ind=ctx.indicators, kz=self._kill_zone_score(now))
 
         result = {
             "signal": mtf_result["final_signal"],
@@ -65,33 +115,36 @@ class SmartMoneyStrategy:
             },
             "features": features,
         }
+        # Unrounded target inputs, as in _generate_signal_pro
+        if result["entry"] is not None and result["stop_loss"] is not None:
+            result["target_base"] = (result["entry"], abs(result["entry"] - result["stop_loss"]))
         for k in ["entry", "stop_loss", "take_profit"]:
             if result[k] is not None:
                 result[k] = round(result[k], 2)
         return result
 
-    def _legacy_analyze(self, df, htf_df):
+    def _legacy_analyze(self, df, htf_df, symbol=None, now=None):
         result = {
             "signal": "NO_SIGNAL", "direction": None, "confidence": 0,
             "entry": None, "stop_loss": None, "take_profit": None,
             "analysis": {}, "features": {},
         }
 
-        structure = self.ms.detect_structure(df)
+        ctx = AnalysisContext(df, htf_df, self.ms, self.ob, self.liq, self.ind, symbol=symbol)
+        structure = ctx.structure
         result["analysis"]["structure"] = structure["trend"]
         result["analysis"]["mode"] = "Pro_2TF"
 
         htf_bias = "neutral"
         if htf_df is not None and len(htf_df) > 50:
-            htf_structure = self.ms.detect_structure(htf_df)
-            htf_bias = htf_structure["trend"]
+            htf_bias = ctx.htf_structure["trend"]
         result["analysis"]["htf_bias"] = htf_bias
 
         # Pro OB detection with HTF alignment
-        obs = self.ob.find_order_blocks(df, htf_df)
-        sweeps = self.liq.detect_liquidity_sweep(df)
-        fvgs = self.liq.find_fvg(df)
-        pd_zone = self.ms.get_premium_discount(df)
+        obs = ctx.order_blocks
+        sweeps = ctx.sweeps
+        fvgs = ctx.fvgs
+        pd_zone = ctx.premium_discount
 
         result["analysis"]["order_blocks"] = len(obs)
         result["analysis"]["sweeps"] = len(sweeps)
@@ -99,15 +152,15 @@ class SmartMoneyStrategy:
         result["analysis"]["zone"] = pd_zone["zone"]
 
         # Kill Zone with proper scoring
-        kz = self._kill_zone_score()
+        kz = self._kill_zone_score(now)
         result["analysis"]["kill_zone"] = kz
 
         # Best OBs
-        best_bull_ob = self.ob.get_best_ob(df, "long", htf_df)
-        best_bear_ob = self.ob.get_best_ob(df, "short", htf_df)
+        best_bull_ob = ctx.best_ob("long")
+        best_bear_ob = ctx.best_ob("short")
 
         # Volume Profile zones
-        vp_zones = self.ob.volume_profile_lite(htf_df if htf_df is not None else df)
+        vp_zones = ctx.vp_zones
         result["analysis"]["vp_zones"] = len(vp_zones)
 
         # Confluence scoring
@@ -121,18 +174,18 @@ class SmartMoneyStrategy:
 
         result["features"] = self._extract_features(
             df, structure, htf_bias, best_bull_ob,
-            sweeps, fvgs, pd_zone, bull, bear
+            sweeps, fvgs, pd_zone, bull, bear, ind=ctx.indicators, kz=kz
         )
 
         sig = self._generate_signal_pro(
-            bull, bear, df, best_bull_ob, best_bear_ob, structure, kz
+            bull, bear, df, best_bull_ob, best_bear_ob, structure, kz, atr=ctx.atr
         )
         result.update(sig)
         return result
 
-    def _kill_zone_score(self):
-        """Kill Zone با امتیاز واقعی"""
-        h = datetime.utcnow().hour
+    def _kill_zone_score(self, now=None):
+        """Kill Zone با امتیاز واقعی (now: UTC time to rate, default the wall clock)"""
+        h = (datetime.utcnow() if now is None else now).hour
 
         # London-NY Overlap (best time)
         if 13 <= h < 16:
@@ -241,10 +294,11 @@ class SmartMoneyStrategy:
 
         return round(bull, 1), round(bear, 1)
 
-    def _generate_signal_pro(self, bull, bear, df, bull_ob, bear_ob, structure, kz):
+    def _generate_signal_pro(self, bull, bear, df, bull_ob, bear_ob, structure, kz, atr=None):
         """Pro Signal Generation with smart SL/TP"""
         price = df["close"].iloc[-1]
-        atr = self.calculate_atr(df)
+        if atr is None:
+            atr = self.calculate_atr(df)
         rr = self.config.RISK_REWARD_RATIO
 
         sig = {
@@ -321,6 +375,11 @@ class SmartMoneyStrategy:
             risk = abs(sig["stop_loss"] - sig["entry"])
             sig["take_profit"] = sig["entry"] - risk * rr
 
+        # Unrounded entry and stop distance: take_profit = round(entry -/+ risk * rr, 2), so a
+        # backtest can re-derive the target for another RISK_REWARD_RATIO without re-analyzing
+        if sig["entry"] is not None:
+            sig["target_base"] = (sig["entry"], abs(sig["entry"] - sig["stop_loss"]))
+
         for k in ["entry", "stop_loss", "take_profit"]:
             if sig[k] is not None:
                 sig[k] = round(sig[k], 2)
@@ -328,16 +387,13 @@ class SmartMoneyStrategy:
         return sig
 
     def _extract_features(self, df, structure, htf_bias, nearest_ob,
-                          sweeps, fvgs, pd_zone, bull, bear):
+                          sweeps, fvgs, pd_zone, bull, bear, ind=None, kz=None):
         price = df["close"].iloc[-1]
-        delta = df["close"].diff()
-        gain = delta.where(delta > 0, 0).rolling(14).mean().iloc[-1]
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean().iloc[-1]
-        rsi = 100 - (100 / (1 + gain / max(loss, 1e-10)))
-        atr = self.calculate_atr(df)
-        vol_sma = df["volume"].rolling(20).mean().iloc[-1]
-        ema12 = df["close"].ewm(span=12).mean().iloc[-1]
-        ema26 = df["close"].ewm(span=26).mean().iloc[-1]
+        if ind is None:
+            ind = self.ind.snapshot(df)
+        rsi = ind["rsi"]
+        atr = ind["atr"]
+        vol_sma = ind["vol_sma"]
         trend_map = {"bullish": 1, "bearish": -1, "neutral": 0}
         zone_map = {"premium": 1, "slight_premium": 0.5, "equilibrium": 0,
                     "slight_discount": -0.5, "discount": -1}
@@ -354,7 +410,7 @@ class SmartMoneyStrategy:
             "vol_ratio": round(df["volume"].iloc[-1] / max(vol_sma, 1), 2),
             "pct_change_1": round((price / df["close"].iloc[-2] - 1) * 100, 4) if len(df) > 1 else 0,
             "pct_change_5": round((price / df["close"].iloc[-5] - 1) * 100, 4) if len(df) > 5 else 0,
-            "macd": round(ema12 - ema26, 4),
+            "macd": round(ind["macd"], 4),
             "trend": trend_map.get(structure["trend"], 0),
             "htf_trend": trend_map.get(htf_bias, 0),
             "structure_strength": structure["strength"],
@@ -362,14 +418,15 @@ class SmartMoneyStrategy:
             "sweep_count": len(sweeps),
             "fvg_count": len(fvgs),
             "zone": zone_map.get(pd_zone["zone"], 0),
-            "kill_zone": self._kill_zone_score()["score"],
+            "kill_zone": (kz or self._kill_zone_score())["score"],
             "bull_score": bull,
             "bear_score": bear,
             "ob_distance": round(ob_dist, 4),
             "spread_score": bull - bear,
         }
 
-    def calculate_atr(self, df, period=14):
-        h, l, c = df["high"], df["low"], df["close"]
-        tr = pd.concat([h - l, abs(h - c.shift(1)), abs(l - c.shift(1))], axis=1).max(axis=1)
-        return tr.rolling(period).mean().iloc[-1]
+    def calculate_atr(self, df, period=indicators.ATR_PERIOD):
+        if period == indicators.ATR_PERIOD:
+            return self.ind.snapshot(df)["atr"]
+        return indicators.atr(df["high"].to_numpy(dtype=float), df["low"].to_numpy(dtype=float),
+                   df["close"].to_numpy(dtype=float), period)[-1]
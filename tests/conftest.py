@@ -0,0 +1,56 @@
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# No log files from test runs: loggers are created when the modules under test are imported
+os.environ["LOG_DIR"] = ""
+
+
+def make_candles(n=500, seed=0, freq="15min", start="2024-01-01"):
+    """Random-walk OHLCV rounded like exchange data (so equal highs/lows occur)"""
+    r = np.random.default_rng(seed)
+    c = 60000 + np.cumsum(r.normal(0, 60, n))
+    o = np.r_[c[0], c[:-1]] + r.normal(0, 10, n)
+    h = np.maximum(o, c) + np.abs(r.normal(0, 40, n))
+    l = np.minimum(o, c) - np.abs(r.normal(0, 40, n))
+    return pd.DataFrame({"open": np.round(o, 1), "high": np.round(h, 1), "low": np.round(l, 1),
+                         "close": np.round(c, 1), "volume": np.abs(r.normal(100, 40, n))},
+                        index=pd.date_range(start, periods=n, freq=freq))
+
+
+@pytest.fixture
+def candles():
+    return make_candles
+
+
+@pytest.fixture
+def set_clock(monkeypatch):
+    """set_clock(hour): pin the wall clock the live kill zone reads to that UTC hour"""
+    import strategy.smart_money as sm
+
+    def pin(hour):
+        class Clock(datetime):
+            @classmethod
+            def utcnow(cls):
+                return datetime(2024, 1, 2, hour, 0)
+
+        monkeypatch.setattr(sm, "datetime", Clock)
+
+    return pin
+
+
+@pytest.fixture
+def london_ny(set_clock):
+    """Pin the kill-zone clock to 14:00 UTC so live-path signals do not depend on when the tests run"""
+    set_clock(14)
+
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path, monkeypatch):
+    # Stores write under data/: keep them out of the checkout
+    monkeypatch.chdir(tmp_path)
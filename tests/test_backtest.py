@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from backtesting.engine import BacktestEngine
+from strategy.smart_money import SmartMoneyStrategy
+
+
+def _engine(rr):
+    en = BacktestEngine(SmartMoneyStrategy())
+    en.config.RISK_REWARD_RATIO = en.strategy.config.RISK_REWARD_RATIO = rr
+    return en
+
+
+def test_run_matches_signals_and_replay(candles, london_ny):
+    # A short window and far targets: trades outlive the window the strategy sees
+    df = candles(900, seed=11)
+    a = _engine(10.0).run(df, progress=False, window=60)
+    en = _engine(10.0)
+    b = en.replay(df, en.signals(df, progress=False, window=60), rr=10.0)
+    assert a["trades"] and a["trades"] == b["trades"]
+    assert a["summary"] == b["summary"]
+    held = [pd.Timestamp(t["exit_time"]) - pd.Timestamp(t["entry_time"]) for t in a["trades"]]
+    assert max(held) > 60 * pd.Timedelta("15min")
+
+
+def test_run_matches_signals_and_replay_with_htf(candles, london_ny):
+    df = candles(700, seed=12)
+    htf = candles(200, seed=13, freq="1h", start="2023-12-25")
+    a = _engine(2.5).run(df, htf, progress=False)
+    en = _engine(2.5)
+    b = en.replay(df, en.signals(df, htf, progress=False), rr=2.5)
+    assert a["trades"] == b["trades"] and a["summary"] == b["summary"]
+
+
+def test_run_and_replay_agree_at_different_clocks(candles, set_clock):
+    df = candles(600, seed=14)
+    set_clock(3)
+    a = _engine(2.5).run(df, progress=False)
+    set_clock(14)
+    en = _engine(2.5)
+    b = en.replay(df, en.signals(df, progress=False), rr=2.5)
+    assert a["trades"] and a["trades"] == b["trades"] and a["summary"] == b["summary"]
+
+
+class Scripted:
+    """Strategy stub: opens the trades in `plan` ({timestamp: (direction, sl, tp)}) when flat"""
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def analyze(self, df, now=None, **frames):
+        c = df["close"].iloc[-1]
+        if df.index[-1] not in self.plan:
+            return {"signal": "NEUTRAL"}
+        d, sl, tp = self.plan[df.index[-1]]
+        return {"signal": "BUY" if d == "long" else "SELL", "direction": d, "entry": c,
+                "stop_loss": c + sl, "take_profit": c + tp, "confidence": 0.8}
+
+
+def test_fast_and_bar_by_bar_runs_agree(candles):
+    df = candles(400, seed=15)
+    r = np.random.default_rng(15)
+    plan = {}
+    for i in range(60, 250, 9):
+        d = float(r.uniform(30, 300))
+        plan[df.index[i]] = ("long", -d, 2 * d) if i % 2 else ("short", d, -2 * d)
+    # A bar through both the stop and the target: the stop wins
+    c = df["close"].iloc[340]
+    plan[df.index[340]] = ("long", -100, 100)
+    df.iloc[341:343, 1:3] = [[c + 10, c - 10]] * 2
+    df.iloc[343, 1:3] = [c + 500, c - 500]
+    # Still open at the end of data
+    plan[df.index[380]] = ("short", 1e6, -1e6)
+    runs = []
+    for fast in (False, True):
+        en = BacktestEngine(Scripted(plan))
+        runs.append((en.run(df, progress=False, fast=fast), en))
+    (a, ea), (b, eb) = runs
+    assert a["trades"] == b["trades"] and a["summary"] == b["summary"]
+    assert ea.eq == eb.eq
+    assert [(t.max_fav, t.max_adv) for t in ea.trades] == [(t.max_fav, t.max_adv) for t in eb.trades]
+    reasons = {t["entry_time"]: t["exit_reason"] for t in a["trades"]}
+    assert reasons[str(df.index[340])] == "stop_loss" and reasons[str(df.index[380])] == "end_of_data"
+    assert {"stop_loss", "take_profit"} <= set(reasons.values())
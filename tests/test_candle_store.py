@@ -0,0 +1,96 @@
+import numpy as np
+
+from utils.candle_store import CandleRing, CandleStore, TF_MS
+
+STEP = TF_MS["15m"]
+
+
+def _rows(n, t0=0, seed=0):
+    r = np.random.default_rng(seed)
+    c = 100 + np.cumsum(r.normal(0, 1, n))
+    return [[t0 + i * STEP, c[i] - 0.5, c[i] + 1, c[i] - 1, c[i], 10.0] for i in range(n)]
+
+
+class FakeExchange:
+    """History of `rows`; the newest `now` of them are visible, fetches return the last `limit`"""
+
+    def __init__(self, rows, now):
+        self.rows = rows
+        self.now = now
+        self.calls = []
+
+    def fetch_ohlcv_rows(self, symbol, tf, limit, min_rows=11):
+        self.calls.append(limit)
+        out = [list(r) for r in self.rows[max(0, self.now - limit):self.now]]
+        return out if len(out) >= min_rows else []
+
+    def now_ms(self):
+        return self.rows[self.now - 1][0] + STEP // 2
+
+
+def test_append_and_overwrite_forming_candle():
+    ring = CandleRing(5)
+    rows = _rows(8)
+    assert ring.update(rows[:3]) == 3
+    forming = list(rows[3])
+    ring.update([forming])
+    forming[4] += 7
+    assert ring.update([rows[2], forming]) == 0
+    assert ring.frame()["close"].iloc[-1] == forming[4] and len(ring) == 4
+    assert ring.update(rows[4:]) == 4 and len(ring) == 5
+    assert list(ring.frame().index.asi8) == [r[0] for r in rows[3:]]
+
+
+def test_views_survive_updates():
+    ring = CandleRing(4)
+    rows = _rows(30, seed=1)
+    ring.update(rows[:4])
+    old = ring.frame()
+    before = old.copy()
+    forming = list(rows[3])
+    forming[4] += 9
+    ring.update([forming])
+    for k in range(4, 30):
+        ring.update([rows[k]])
+    assert old.equals(before)
+    assert np.array_equal(ring.frame().to_numpy(), np.array(rows[-4:])[:, 1:])
+
+
+def test_refresh_fetches_only_missing_candles():
+    ex = FakeExchange(_rows(400, seed=2), 200)
+    store = CandleStore(capacity=300)
+    store.refresh(ex, "A", "15m", 150, ex.now_ms())
+    ex.now += 3
+    ring = store.refresh(ex, "A", "15m", 150, ex.now_ms())
+    assert ex.calls == [150, 5]
+    assert np.array_equal(ring.frame(150).to_numpy(), np.array(ex.rows[ex.now - 150:ex.now])[:, 1:])
+
+
+def test_refresh_resets_instead_of_leaving_a_gap():
+    ex = FakeExchange(_rows(1000, seed=3), 200)
+    store = CandleStore(capacity=300)
+    store.refresh(ex, "A", "15m", 150, ex.now_ms())
+    ex.now += 400
+    ring = store.refresh(ex, "A", "15m", 150, ex.now_ms())
+    assert ex.calls == [150, 150]
+    ts = ring.frame().index.asi8
+    assert len(ring) == 150 and (np.diff(ts) == STEP).all() and ts[-1] == ex.rows[ex.now - 1][0]
+
+
+def test_only_rewrites_of_viewed_rows_copy():
+    ring = CandleRing(4)
+    rows = _rows(6, seed=4)
+    ring.update(rows[:3])
+    ts, data = ring.view()
+    block = ring.data
+    ring.update(rows[3:5])
+    assert ring.data is block
+    forming = list(rows[4])
+    forming[4] += 5
+    ring.update([forming])
+    assert ring.data is block
+    ring.frame()
+    ring.update([rows[4]])
+    assert ring.data is not block and ring.start == 0 and len(ring) == 4
+    assert np.array_equal(data, np.array(rows[:3])[:, 1:])
+    assert np.array_equal(ring.frame().to_numpy(), np.array(rows[1:5])[:, 1:])
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from strategy.indicators import IndicatorEngine, EMA_FAST, EMA_SLOW
+
+
+def _pandas(df):
+    c, h, l = df["close"], df["high"], df["low"]
+    d = c.diff()
+    gain = d.where(d > 0, 0).rolling(14).mean().iloc[-1]
+    loss = (-d.where(d < 0, 0)).rolling(14).mean().iloc[-1]
+    tr = np.maximum(h - l, np.maximum((h - c.shift()).abs(), (l - c.shift()).abs()))
+    fast = c.ewm(span=EMA_FAST).mean().iloc[-1]
+    slow = c.ewm(span=EMA_SLOW).mean().iloc[-1]
+    return {"rsi": 100 - 100 / (1 + gain / max(loss, 1e-10)), "atr": tr.rolling(14).mean().iloc[-1],
+            "vol_sma": df["volume"].rolling(20).mean().iloc[-1], f"ema{EMA_FAST}": fast,
+            f"ema{EMA_SLOW}": slow, "macd": fast - slow}
+
+
+def _check(snap, df):
+    want = _pandas(df)
+    for k, v in want.items():
+        assert snap[k] == pytest.approx(v, rel=1e-9, abs=1e-9), k
+
+
+def test_rolling_window_matches_pandas(candles):
+    df = candles(600, seed=11)
+    ind = IndicatorEngine()
+    for i in range(300, len(df)):
+        w = df.iloc[i - 300:i + 1]
+        _check(ind.snapshot(w), w)
+
+
+def test_growing_frame_and_forming_candle(candles):
+    df = candles(400, seed=12)
+    ind = IndicatorEngine()
+    for i in range(100, len(df), 3):
+        w = df.iloc[:i].copy()
+        _check(ind.snapshot(w), w)
+        # Results are memoized per frame object: a re-read forming candle comes in a new frame
+        w = w.copy()
+        w.iloc[-1, w.columns.get_loc("close")] += 250
+        _check(ind.snapshot(w), w)
+
+
+def test_changed_closed_candle_resets_sums(candles):
+    df = candles(300, seed=13)
+    ind = IndicatorEngine()
+    ind.snapshot(df)
+    edited = df.copy()
+    edited.iloc[-2, edited.columns.get_loc("close")] += 500
+    _check(ind.snapshot(edited), edited)
+
+
+def test_streams_are_per_symbol(candles):
+    a, b = candles(300, seed=14), candles(300, seed=15)
+    ind = IndicatorEngine()
+    ind.snapshot(a, symbol="A")
+    _check(ind.snapshot(b, symbol="B"), b)
+    _check(ind.snapshot(a, symbol="A"), a)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from strategy import kernels
+from strategy.liquidity import LiquidityAnalyzer
+
+
+def _touch_status_cases(r):
+    for n in (5, 60, 400):
+        c = np.round(100 + np.cumsum(r.normal(0, 1, n)), 1)
+        h, l = c + np.abs(r.normal(0, 0.5, n)), c - np.abs(r.normal(0, 0.5, n))
+        k = 12
+        mid = c[r.integers(0, n, k)]
+        top, bottom = mid + r.uniform(0, 1, k), mid - r.uniform(0, 1, k)
+        starts = r.integers(0, n + 3, k)
+        yield (l, h, c, starts, top, bottom, r.random(k) < 0.5)
+
+
+def _eq_levels_cases(r):
+    la = LiquidityAnalyzer()
+    for n in (3, 80, 600):
+        v = np.round(100 + np.cumsum(r.normal(0, 0.3, n)), 1)
+        tol = 0.1
+        cnt, ctot, ref = la._forward_touches(v, tol)
+        t = cnt + 1
+        cand = np.flatnonzero(t[:-1] >= 2)
+        yield (v, tol, cand, ref + ctot[cand] / t[cand], t)
+
+
+def _ema_cases(r):
+    for n, span in ((1, 12), (50, 26), (3000, 200)):
+        yield (100 + np.cumsum(r.normal(0, 1, n)), span)
+
+
+def _first_hit_cases(r):
+    n = 300
+    c = 100 + np.cumsum(r.normal(0, 0.5, n))
+    h, l = c + np.abs(r.normal(0, 0.4, n)), c - np.abs(r.normal(0, 0.4, n))
+    h[150], l[150] = c[150] + 50, c[150] - 50  # one bar through both the stop and the target
+    for start in (0, 10, 140, 299, 300):
+        e = c[min(start, n - 1)]
+        for long in (True, False):
+            for d in (0.5, 2.0, 1000.0):  # quick exit, later exit, never (end of data)
+                sl, tp = (e - d, e + 2 * d) if long else (e + d, e - 2 * d)
+                yield (h, l, start, e, sl, tp, long)
+
+
+CASES = {"touch_status": _touch_status_cases, "eq_levels": _eq_levels_cases,
+         "ema": _ema_cases, "first_hit": _first_hit_cases}
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_numpy_fallback_matches_loop(name, monkeypatch):
+    monkeypatch.setattr(kernels, f"_{name}_jit", None)
+    loop = getattr(kernels, f"_{name}_loop")
+    for args in CASES[name](np.random.default_rng(0)):
+        got, want = getattr(kernels, name)(*args), loop(*args)
+        if name == "ema":
+            # Closed-form blocks vs the recurrence: equal up to rounding
+            np.testing.assert_allclose(got, want, rtol=1e-12)
+        else:
+            for g, w in zip(got, want):
+                np.testing.assert_array_equal(g, w)
@@ -0,0 +1,18 @@
+import numpy as np
+
+from strategy.liquidity import LiquidityAnalyzer
+
+
+def _resampled(df):
+    daily = df.resample("D").agg({"high": "max", "low": "min"}).dropna()
+    return (daily.iloc[-2]["high"], daily.iloc[-2]["low"]) if len(daily) > 1 else None
+
+
+def test_prev_day_range_matches_resample(candles):
+    la = LiquidityAnalyzer()
+    df = candles(600, seed=20, freq="1h")
+    gap = df.drop(df.index[200:260])
+    blank = df.copy()
+    blank.loc[blank.index[-30:-2], ["high", "low"]] = np.nan
+    for d in (df, gap, blank, df.iloc[:20], df.iloc[-30:]):
+        assert la._prev_day_range(d) == _resampled(d)
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from config import Config
+from strategy.market_structure import MarketStructure
+
+
+def _batch(df):
+    cfg = Config()
+    cfg.INCREMENTAL_STRUCTURE = False
+    return MarketStructure(cfg).detect_structure(df)
+
+
+def _same(a, b):
+    assert a["trend"] == b["trend"] and a["strength"] == b["strength"]
+    assert a["bos_levels"] == b["bos_levels"] and a["choch_levels"] == b["choch_levels"]
+    pd.testing.assert_series_equal(a["swing_highs"], b["swing_highs"], check_names=False, check_freq=False)
+    pd.testing.assert_series_equal(a["swing_lows"], b["swing_lows"], check_names=False, check_freq=False)
+
+
+def test_incremental_matches_batch_on_rolling_window(candles):
+    df = candles(700, seed=1)
+    ms = MarketStructure()
+    for i in range(200, len(df)):
+        w = df.iloc[i - 200:i + 1]
+        _same(ms.detect_structure(w, stream="entry"), _batch(w))
+
+
+def test_forming_candle_is_replaced(candles):
+    df = candles(400, seed=2)
+    ms = MarketStructure()
+    ms.detect_structure(df, stream="entry")
+    forming = df.copy()
+    forming.iloc[-1, forming.columns.get_loc("high")] += 500
+    forming.iloc[-1, forming.columns.get_loc("close")] += 400
+    _same(ms.detect_structure(forming, stream="entry"), _batch(forming))
+
+
+def test_changed_closed_candle_rebuilds_tracker(candles):
+    df = candles(400, seed=3)
+    ms = MarketStructure()
+    ms.detect_structure(df, stream="entry")
+    edited = df.copy()
+    edited.iloc[-2, edited.columns.get_loc("low")] -= 900
+    _same(ms.detect_structure(edited, stream="entry"), _batch(edited))
+
+
+def test_trackers_are_per_symbol(candles):
+    a, b = candles(400, seed=4), candles(400, seed=5)
+    ms = MarketStructure()
+    ms.detect_structure(a, stream="entry", symbol="A")
+    _same(ms.detect_structure(b, stream="entry", symbol="B"), _batch(b))
+    _same(ms.detect_structure(a, stream="entry", symbol="A"), _batch(a))
+
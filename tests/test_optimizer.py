@@ -0,0 +1,111 @@
+import os
+import sys
+from multiprocessing import shared_memory
+
+import pandas as pd
+import pytest
+
+from backtesting import optimizer
+from backtesting.engine import BacktestEngine
+from backtesting.optimizer import SharedFrames, fold_sizes, grid_search, halving_search, score, walk_forward
+from strategy.smart_money import SmartMoneyStrategy
+
+GRID = {"SWING_LOOKBACK": [5, 10], "RISK_REWARD_RATIO": [2.0, 3.0]}
+
+
+def test_combos_group_by_signal_params():
+    combos, _ = optimizer._combos(dict(GRID, LEVERAGE=[5, 10]))
+    groups = optimizer._groups(combos)
+    assert len(groups) == 2 and all(len(g) == 4 for g in groups)
+    assert all(len({p["SWING_LOOKBACK"] for p in g}) == 1 for g in groups)
+
+
+def test_pool_matches_serial_and_frees_shared_memory(candles, london_ny, monkeypatch):
+    df = candles(300, seed=30)
+    names = []
+    real = SharedFrames.close
+
+    def close(sf):
+        names.append(sf.shm.name)
+        real(sf)
+
+    monkeypatch.setattr(SharedFrames, "close", close)
+    serial = grid_search(df, None, GRID, workers=1, cache=True)
+    # One signal table per group
+    assert len(os.listdir("data/signals")) == 2
+    assert grid_search(df, None, GRID, workers=2) == serial
+    assert serial[0] and not serial[1]
+    assert len(names) == 1
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=names[0])
+
+
+HALVING_GRID = {"RISK_REWARD_RATIO": [1.5, 2.0, 2.5, 3.0, 3.5, 4.0], "RISK_PER_TRADE": [0.01, 0.02]}
+
+
+def _halving(df, **kw):
+    totals = []
+    res, fail = halving_search(df, None, HALVING_GRID, workers=1, min_bars=60,
+                               progress=lambda done, total, best: totals.append(total), **kw)
+    assert not fail
+    return res, totals
+
+
+def test_halving_keeps_the_grid_winner(candles, london_ny):
+    df = candles(600, seed=35)
+    full, _ = grid_search(df, None, HALVING_GRID, workers=1)
+    res, rungs = _halving(df)
+    assert rungs == [12, 4, 2]
+    assert res[0]["params"] == full[0]["params"]
+    # The last rung runs on the whole history: same scores as the full grid
+    scores = {tuple(r["params"].items()): r["score"] for r in full}
+    assert all(scores[tuple(r["params"].items())] == r["score"] for r in res)
+    assert _halving(df, eta=2)[1] == [12, 6, 3, 2]
+
+
+@pytest.mark.parametrize("surrogate", [False, True])
+def test_halving_max_configs_without_sklearn(candles, london_ny, monkeypatch, surrogate):
+    monkeypatch.setitem(sys.modules, "sklearn.ensemble", None)
+    df = candles(600, seed=35)
+    res, rungs = _halving(df, max_configs=6, surrogate=surrogate, seed=4)
+    assert rungs == [3, 3, 2, 1]
+    assert res == _halving(df, max_configs=6, surrogate=surrogate, seed=4)[0]
+
+
+def test_walk_forward_folds_train_and_test_apart(candles, london_ny):
+    df = candles(700, seed=32)
+    grid = {"RISK_REWARD_RATIO": [2.0, 3.0]}
+    wf = walk_forward(df, None, grid, 300, 100, workers=1)
+    wins = [(a, a + 300, a + 400) for a in range(0, 301, 100)]
+    assert [f["train"] for f in wf["folds"]] == [(str(df.index[a]), str(df.index[b - 1])) for a, b, _ in wins]
+    assert [f["test"] for f in wf["folds"]] == [(str(df.index[b]), str(df.index[c - 1])) for _, b, c in wins]
+    # Each winner is the best on its train window alone; the report is its test windows only
+    tab = BacktestEngine(SmartMoneyStrategy()).signals(df, progress=False)
+    cut = lambda a, b: (df.iloc[a:b], tab[(tab.index >= df.index[a]) & (tab.index <= df.index[b - 1])])
+    bal, trades = BacktestEngine(None).ib, 0
+    for (a, b, c), f in zip(wins, wf["folds"]):
+        scores = []
+        for rr in grid["RISK_REWARD_RATIO"]:
+            r = BacktestEngine(None).replay(*cut(a, b), 0, rr=rr)
+            scores.append((score(r["summary"]), -rr))
+        assert (f["train_score"], -f["params"]["RISK_REWARD_RATIO"]) == max(scores)
+        en = BacktestEngine(None, bal)
+        assert f["summary"] == en.replay(*cut(b, c), 0, rr=f["params"]["RISK_REWARD_RATIO"])["summary"]
+        bal, trades = en.balance, trades + len(en.trades)
+    t0, t1 = df.index[300], df.index[-1]
+    assert all(t0 <= pd.Timestamp(t["entry_time"]) <= t1 for t in wf["report"]["trades"])
+    assert wf["report"]["summary"]["total_trades"] == trades
+    assert wf["report"]["summary"]["final_balance"] == round(bal, 2)
+
+
+@pytest.mark.parametrize("train,test", [(0, 100), (300, 0), (600, 101)])
+def test_walk_forward_rejects_bad_windows(candles, train, test):
+    with pytest.raises(ValueError):
+        walk_forward(candles(700), None, {"RISK_REWARD_RATIO": [2.0]}, train, test, workers=1)
+
+
+def test_fold_sizes():
+    assert fold_sizes(700, 4, 3.0) == (300, 100)
+    for folds, ratio, n in ((0, 3.0, 700), (4, 0, 700), (4, -1.0, 700), (4, 3.0, 6), (4, 0.01, 50)):
+        with pytest.raises(ValueError):
+            fold_sizes(n, folds, ratio)
@@ -0,0 +1,31 @@
+from strategy.order_blocks import OrderBlockDetector
+
+
+def test_htf_context_is_per_symbol(candles):
+    ha = candles(200, seed=21, freq="4h")
+    hb = candles(200, seed=22, freq="4h")
+    ob = OrderBlockDetector()
+    ob.htf_context(ha, "A")
+    assert ob.htf_context(hb, "B")["vp_zones"] == OrderBlockDetector().volume_profile_lite(hb)
+    assert ob.htf_cache.stats()["hits"] == 0
+
+
+def test_htf_context_follows_forming_candle(candles):
+    htf = candles(200, seed=23, freq="4h")
+    ob = OrderBlockDetector()
+    ob.htf_context(htf, "A")
+    assert ob.htf_context(htf.copy(), "A") is ob.htf_context(htf, "A")
+    moved = htf.copy()
+    moved.iloc[-1, moved.columns.get_loc("high")] += 3000
+    moved.iloc[-1, moved.columns.get_loc("volume")] += 5000
+    assert ob.htf_context(moved, "A")["vp_zones"] == OrderBlockDetector().volume_profile_lite(moved)
+
+
+def test_htf_context_resolved_once_per_call(candles):
+    df = candles(500, seed=24)
+    htf = candles(200, seed=25, freq="4h", start="2023-11-01")
+    ob = OrderBlockDetector()
+    found = ob.find_order_blocks(df, htf)
+    assert len(found) > 1
+    assert ob.htf_cache.stats()["hits"] + ob.htf_cache.stats()["misses"] == 1
+    assert ob.find_order_blocks(df, htf, htf_ctx=ob.htf_context(htf)) == found
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from backtesting.engine import BacktestEngine
+from backtesting.portfolio import PortfolioEngine
+
+
+@pytest.fixture
+def basket(candles, london_ny):
+    data = {"A": (candles(500, seed=70), None), "B": (candles(500, seed=71), None)}
+    return data, PortfolioEngine().signals(data, workers=1)
+
+
+def _open_at(trades, t):
+    return sum(pd.Timestamp(x["entry_time"]) <= t < pd.Timestamp(x["exit_time"]) for x in trades)
+
+
+def test_two_symbols_share_the_open_trade_limit(basket):
+    data, tables = basket
+    r = PortfolioEngine(max_open=1).replay(data, tables)
+    assert {t["symbol"] for t in r["trades"]} == {"A", "B"}
+    assert r["symbols"]["A"]["trades"] + r["symbols"]["B"]["trades"] == r["summary"]["total_trades"]
+    assert r["skipped"] > 0
+    assert max(_open_at(r["trades"], pd.Timestamp(t["entry_time"])) for t in r["trades"]) == 1
+
+
+def test_one_symbol_portfolio_matches_replay(basket):
+    data, tables = basket
+    r = PortfolioEngine().replay({"A": data["A"]}, {"A": tables["A"]})
+    en = BacktestEngine(None)
+    assert r["summary"] == en.replay(data["A"][0], tables["A"])["summary"]
+
+
+def test_total_notional_within_margin(basket, monkeypatch):
+    data, tables = basket
+    seen = []
+    real = BacktestEngine._open
+
+    def spy(en, a, t, used=0):
+        real(en, a, t, used)
+        if en.ot:
+            seen.append((used, used + en.ot.entry_price * en.ot.size, en.balance * en.config.LEVERAGE * 0.95))
+
+    monkeypatch.setattr(BacktestEngine, "_open", spy)
+    PortfolioEngine().replay(data, tables)
+    assert any(used > 0 for used, _, _ in seen)
+    assert all(total <= cap * (1 + 1e-9) for _, total, cap in seen)
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+
+from backtesting.engine import BacktestEngine
+from backtesting.optimizer import grid_search
+from backtesting.signals import SignalStore, signal_key, signal_params
+from config import Config
+from strategy.smart_money import SmartMoneyStrategy
+
+
+def test_key_covers_candle_values(candles):
+    df = candles(300, seed=1)
+    edited = df.copy()
+    edited.iloc[150, edited.columns.get_loc("close")] += 1
+    assert signal_key(df, {}) == signal_key(df.copy(), {})
+    assert signal_key(df, {}) != signal_key(edited, {})
+    assert signal_key(df, {}, df.iloc[100:]) != signal_key(df, {}, edited.iloc[100:])
+
+
+def test_params_are_strategy_settings_only():
+    a, b = Config(), Config()
+    b.API_KEY, b.TELEGRAM_TOKEN, b.RISK_REWARD_RATIO = "x", "y", 9
+    assert signal_params(a) == signal_params(b)
+    b.SWING_LOOKBACK += 1
+    assert signal_params(a) != signal_params(b)
+    assert "MY_SETTING" in signal_params(type("C", (), {"MY_SETTING": 1})(), ["MY_SETTING"])
+
+
+def test_store_without_path_always_builds():
+    built = []
+    table = pd.DataFrame({"signal": ["BUY"]}, index=pd.DatetimeIndex(["2024-01-01"], name="timestamp"))
+    store = SignalStore(None)
+    for _ in range(2):
+        store.get("k", lambda: built.append(1) or table)
+    assert len(built) == 2 and not os.path.exists("data/signals")
+
+
+def test_clear():
+    store = SignalStore()
+    for k in ("a", "b"):
+        store.save(pd.DataFrame({"x": [1.0]}), k)
+    assert store.clear() == 2 and store.load("a") is None
+
+
+def test_optimizer_does_not_persist_by_default(candles, london_ny):
+    df = candles(260, seed=2)
+    res, fail = grid_search(df, None, {"RISK_REWARD_RATIO": [2.0, 3.0]}, workers=1)
+    assert len(res) + len(fail) == 2 and not os.path.exists("data/signals")
+    grid_search(df, None, {"RISK_REWARD_RATIO": [2.0]}, workers=1, cache=True)
+    assert len(os.listdir("data/signals")) == 1
+
+
+def test_reloaded_table_does_not_depend_on_the_clock(candles, set_clock):
+    df = candles(400, seed=3)
+    set_clock(3)
+    store = SignalStore()
+    key = signal_key(df, signal_params(Config()))
+    stored = store.get(key, lambda: BacktestEngine(SmartMoneyStrategy()).signals(df, progress=False))
+    set_clock(14)
+    fresh = BacktestEngine(SmartMoneyStrategy()).signals(df, progress=False)
+    assert len(fresh) and fresh["signal"].nunique() > 1
+    pd.testing.assert_frame_equal(store.load(key), fresh, check_freq=False, check_dtype=False, check_names=False)
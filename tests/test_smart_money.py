@@ -0,0 +1,73 @@
+import pandas as pd
+
+from config import Config
+from strategy.smart_money import SmartMoneyStrategy
+
+KEYS = ("signal", "direction", "confidence", "entry", "stop_loss", "take_profit", "analysis", "features")
+
+
+def _pick(a):
+    return {k: a.get(k) for k in KEYS}
+
+
+def test_second_symbol_on_same_strategy(candles, london_ny):
+    a, b = candles(500, seed=6), candles(500, seed=7)
+    ha = candles(200, seed=8, freq="4h", start="2023-11-01")
+    hb = candles(200, seed=9, freq="4h", start="2023-11-01")
+    shared = SmartMoneyStrategy()
+    shared.analyze(a, ha, symbol="A")
+    assert _pick(shared.analyze(b, hb, symbol="B")) == _pick(SmartMoneyStrategy().analyze(b, hb, symbol="B"))
+    assert _pick(shared.analyze(a, ha, symbol="A")) == _pick(SmartMoneyStrategy().analyze(a, ha, symbol="A"))
+
+
+def test_second_symbol_on_same_strategy_mtf(candles, london_ny):
+    frames = {}
+    for k, seed in (("A", 30), ("B", 40)):
+        frames[k] = (candles(500, seed=seed), candles(200, seed=seed + 1, freq="4h", start="2023-11-01"),
+                     candles(120, seed=seed + 2, freq="1D", start="2023-09-01"),
+                     candles(300, seed=seed + 3, freq="5min", start="2024-01-05"))
+    shared = SmartMoneyStrategy()
+    shared.analyze(*frames["A"], symbol="A")
+    assert _pick(shared.analyze(*frames["B"], symbol="B")) == _pick(SmartMoneyStrategy().analyze(*frames["B"], symbol="B"))
+    assert _pick(shared.analyze(*frames["A"], symbol="A")) == _pick(SmartMoneyStrategy().analyze(*frames["A"], symbol="A"))
+
+
+def test_mtf_cache_sees_the_forming_candle(candles, london_ny):
+    df, htf = candles(500, seed=50), candles(200, seed=51, freq="4h", start="2023-11-01")
+    d1, sn = candles(120, seed=52, freq="1D", start="2023-09-01"), candles(300, seed=53, freq="5min", start="2024-01-05")
+    # The forming 4h candle breaks above every high before it, within the same 4h period
+    broken = htf.copy()
+    top = htf["high"].iloc[:-1].max() + 500
+    broken.iloc[-1, [broken.columns.get_loc(k) for k in ("high", "close")]] = [top + 10, top]
+    off = Config()
+    off.MTF_CACHE = False
+    st, ref = SmartMoneyStrategy(), SmartMoneyStrategy(off)
+    seen = []
+    for h in (htf, broken, htf):
+        td = {"direction": d1, "structure": h, "entry": df, "sniper": sn}
+        got = st.mtf.analyze_all_timeframes(td, symbol="A")["details"]
+        assert got == ref.mtf.analyze_all_timeframes(td, symbol="A")["details"]
+        seen.append(got["structure"])
+    assert seen[0] != seen[1]
+    assert st.mtf.tf_cache.stats()["misses"] == 3 and st.mtf.tf_cache.stats()["hits"] == 3
+
+
+def test_series_rows_are_windowed_analyses(candles, london_ny):
+    df, htf = candles(400, seed=60), candles(150, seed=61, freq="1h", start="2023-12-28")
+    tab = SmartMoneyStrategy().analyze_series(df, htf, bars=range(300, 400, 7), window=120, htf_window=40)
+    st = SmartMoneyStrategy()
+    for i in range(300, 400, 7):
+        h = htf[htf.index + htf.index.freq <= df.index[i] + df.index.freq].iloc[-40:]
+        a = st.analyze(df.iloc[i - 119:i + 1], h, now=df.index[i] + df.index.freq)
+        want = {**{k: a[k] for k in KEYS[:6]}, **a["features"]}
+        got = tab.loc[df.index[i], list(want)].to_dict()
+        assert {k: None if pd.isna(v) else v for k, v in got.items()} == want
+
+
+def test_series_skips_failing_bars(candles, caplog):
+    df = candles(120, seed=62)
+    st = SmartMoneyStrategy()
+    real = st.analyze
+    st.analyze = lambda d, **kw: (_ for _ in ()).throw(RuntimeError("boom")) if len(d) == 100 else real(d, **kw)
+    tab = st.analyze_series(df, bars=range(95, 105))
+    assert df.index[99] not in tab.index and len(tab) == 9
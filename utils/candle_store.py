@@ -0,0 +1,146 @@
+import numpy as np, pandas as pd
+from config import Config
+from utils.logger import setup_logger
+logger = setup_logger("CandleStore")
+
+COLUMNS = ["open", "high", "low", "close", "volume"]
+TF_MS = {"1m":60000,"3m":180000,"5m":300000,"15m":900000,"30m":1800000,"1h":3600000,"4h":14400000,"1d":86400000}
+
+
+class CandleRing:
+    """
+    Fixed-capacity OHLCV buffer for one (symbol, timeframe)
+
+    Rows live in a NumPy block twice the capacity: candles are appended in place and
+    only when the block is full are the newest `capacity` rows moved back to the
+    front, so the latest candles are always one contiguous slice. view() and frame()
+    hand out read-only views of that slice. They never change afterwards: before
+    rewriting a row a view may cover (the forming candle, the move to the front),
+    update() moves the ring to a fresh block holding only its live rows; appends go
+    past the end of every view and copy nothing.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = np.zeros(2 * capacity, dtype="datetime64[ms]")
+        self.data = np.zeros((2 * capacity, len(COLUMNS)))
+        self.start = self.end = 0
+        self.version = 0
+        self._frame = None
+        self._shared_end = 0  # rows below this may be in handed-out views
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def last_ts(self):
+        """Open time (ms) of the newest candle, None when empty"""
+        return int(self.ts[self.end - 1].astype(np.int64)) if len(self) else None
+
+    def update(self, rows):
+        """
+        Merge ccxt OHLCV rows [ts_ms, o, h, l, c, v] (oldest first): the newest stored
+        candle is overwritten (it may have been forming), newer ones are appended,
+        older ones are already closed and skipped. Returns the number of new candles.
+        """
+        last = self.last_ts
+        added = 0
+        for r in rows:
+            t = int(r[0])
+            if last is not None and t < last:
+                continue
+            if last is not None and t == last:
+                if self.end - 1 < self._shared_end:
+                    self._own()
+                self.data[self.end - 1] = r[1:6]
+            else:
+                if self.end == len(self.ts):
+                    keep = self.capacity - 1
+                    if self._shared_end:
+                        self._own(keep)
+                    else:
+                        self.ts[:keep] = self.ts[self.end - keep:self.end]
+                        self.data[:keep] = self.data[self.end - keep:self.end]
+                        self.start, self.end = 0, keep
+                self.ts[self.end] = t
+                self.data[self.end] = r[1:6]
+                self.end += 1
+                self.start = max(self.start, self.end - self.capacity)
+                added += 1
+            last = t
+        if rows:
+            self.version += 1
+            self._frame = None
+        return added
+
+    def _own(self, keep=None):
+        # Copy-on-write: handed-out views keep the old block, the ring continues on a fresh
+        # one with only its newest `keep` rows (default: all live rows) copied to the front
+        keep = len(self) if keep is None else keep
+        ts, data = np.empty_like(self.ts), np.empty_like(self.data)
+        ts[:keep] = self.ts[self.end - keep:self.end]
+        data[:keep] = self.data[self.end - keep:self.end]
+        self.ts, self.data = ts, data
+        self.start, self.end = 0, keep
+        self._shared_end = 0
+
+    def view(self, n=None):
+        """(timestamps, ohlcv) of the newest n candles as read-only views, columns as in COLUMNS"""
+        s = self.start if n is None else max(self.start, self.end - n)
+        ts, data = self.ts[s:self.end], self.data[s:self.end]
+        ts.flags.writeable = False
+        data.flags.writeable = False
+        self._shared_end = self.end
+        return ts, data
+
+    def frame(self, n=None):
+        """DataFrame over view(n) without copying; the same object until the next update()"""
+        if self._frame is not None and self._frame[0] == n:
+            return self._frame[1]
+        ts, data = self.view(n)
+        df = pd.DataFrame(data, index=pd.DatetimeIndex(ts, copy=False, name="timestamp"), columns=COLUMNS, copy=False)
+        self._frame = (n, df)
+        return df
+
+
+class CandleStore:
+    """One CandleRing per (symbol, timeframe), topped up with only the candles missing since the last fetch"""
+
+    def __init__(self, capacity=None):
+        self.config = Config()
+        self.capacity = capacity or self.config.CANDLE_BUFFER
+        self.rings = {}
+        self.hit = 0
+        self.miss = 0
+
+    def ring(self, symbol, tf, limit=0):
+        key = (symbol, tf)
+        r = self.rings.get(key)
+        if r is None or r.capacity < limit:
+            r = CandleRing(max(self.capacity, limit))
+            self.rings[key] = r
+        return r
+
+    def refresh(self, exchange, symbol, tf, limit, now_ms):
+        """
+        Fetch what the ring is missing: everything on first use, else the candles since its
+        newest one. A ring too far behind for one fetch of `limit` candles to reach its newest
+        candle is replaced by a fresh one, so the buffer never holds a silent gap.
+        """
+        r = self.ring(symbol, tf, limit)
+        step = TF_MS.get(tf)
+        if len(r) and step:
+            need = (now_ms - r.last_ts) // step + 2
+            if need <= limit:
+                rows = exchange.fetch_ohlcv_rows(symbol, tf, need, min_rows=1)
+                if not rows or int(rows[0][0]) <= r.last_ts + step:
+                    r.update(rows)
+                    return r
+            logger.info(f"{symbol} {tf}: {need - 1} candles behind, reloading {limit}")
+            r = self.rings[(symbol, tf)] = CandleRing(r.capacity)
+        r.update(exchange.fetch_ohlcv_rows(symbol, tf, limit))
+        return r
+
+    def stats(self):
+        t = self.hit + self.miss
+        return {"hits": self.hit, "misses": self.miss, "rate": f"{self.hit/max(t,1)*100:.0f}%", "cached": len(self.rings)}
@@ -2,8 +2,8 @@ import logging, os
 from datetime import datetime
 
 def setup_logger(name="SmartMoneyBot"):
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
+    # LOG_DIR: where the daily log file goes (empty = console only)
+    log_dir = os.getenv("LOG_DIR", "logs")
     logger = logging.getLogger(name)
     if logger.handlers:
         return logger
@@ -12,9 +12,11 @@ def setup_logger(name="SmartMoneyBot"):
     ch = logging.StreamHandler()
     ch.setLevel(logging.INFO)
     ch.setFormatter(fmt)
-    fh = logging.FileHandler(os.path.join(log_dir, f"bot_{datetime.now().strftime('%Y%m%d')}.log"), encoding="utf-8")
-    fh.setLevel(logging.DEBUG)
-    fh.setFormatter(fmt)
     logger.addHandler(ch)
-    logger.addHandler(fh)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        fh = logging.FileHandler(os.path.join(log_dir, f"bot_{datetime.now().strftime('%Y%m%d')}.log"), encoding="utf-8")
+        fh.setLevel(logging.DEBUG)
+        fh.setFormatter(fmt)
+        logger.addHandler(fh)
     return logger
@@ -1,33 +1,33 @@
 import time, gc, pandas as pd
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from config import Config
 from utils.logger import setup_logger
+from utils.candle_store import CandleStore
 logger = setup_logger("Performance")
 
-class CandleCache:
-    def __init__(self):
-        self.cache = {}
-        self.expiry = {}
+class ResultCache:
+    """Small LRU for derived results (analysis layers, HTF contexts) with hit/miss stats"""
+
+    def __init__(self, max_size=16):
+        self.cache = OrderedDict()
+        self.max_size = max_size
         self.hit = 0
         self.miss = 0
 
     def get(self, key):
-        if key in self.cache and datetime.utcnow() < self.expiry.get(key, datetime.min):
+        if key in self.cache:
             self.hit += 1
-            return self.cache[key].copy()
+            self.cache.move_to_end(key)
+            return self.cache[key]
         self.miss += 1
         return None
 
-    def set(self, key, df, ttl=60):
-        self.cache[key] = df.copy()
-        self.expiry[key] = datetime.utcnow() + timedelta(seconds=ttl)
-
-    def clear_expired(self):
-        now = datetime.utcnow()
-        expired = [k for k,v in self.expiry.items() if now >= v]
-        for k in expired:
-            del self.cache[k]
-            del self.expiry[k]
+    def set(self, key, value):
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
 
     def stats(self):
         t = self.hit + self.miss
@@ -36,28 +36,36 @@ class CandleCache:
 class PerformanceManager:
     def __init__(self):
         self.config = Config()
-        self.candle_cache = CandleCache()
+        self.candle_store = CandleStore()
+        self.expiry = {}
         self.cycle_times = []
         self.last_gc = datetime.utcnow()
+        self.caches = {}
+
+    def register_cache(self, name, cache):
+        """Report another cache (anything with stats()) in get_stats under `name`"""
+        self.caches[name] = cache
 
     def get_tf_ttl(self, tf):
         return {"1m":50,"3m":150,"5m":250,"15m":800,"30m":1700,"1h":3400,"4h":13000,"1d":80000}.get(tf, 300)
 
     def get_cached_candles(self, exchange, symbol, tf, limit=500):
+        """Newest `limit` candles as a read-only DataFrame view over the (symbol, tf) ring buffer"""
         if not self.config.CACHE_CANDLES:
             return exchange.fetch_ohlcv(symbol, tf, limit)
-        key = f"{symbol}_{tf}"
-        cached = self.candle_cache.get(key)
-        if cached is not None:
-            return cached
-        df = exchange.fetch_ohlcv(symbol, tf, limit)
-        if not df.empty:
-            self.candle_cache.set(key, df, self.get_tf_ttl(tf))
-        return df
+        store = self.candle_store; key = (symbol, tf); now = datetime.utcnow()
+        ring = store.rings.get(key)
+        if ring is not None and len(ring) and now < self.expiry.get(key, datetime.min):
+            store.hit += 1
+            return ring.frame(limit)
+        store.miss += 1
+        ring = store.refresh(exchange, symbol, tf, limit, int(time.time() * 1000))
+        if len(ring):
+            self.expiry[key] = now + timedelta(seconds=self.get_tf_ttl(tf))
+        return ring.frame(limit)
 
     def optimize_memory(self):
         if (datetime.utcnow() - self.last_gc).total_seconds() > 300:
-            self.candle_cache.clear_expired()
             gc.collect()
             self.last_gc = datetime.utcnow()
 
@@ -73,4 +81,7 @@ class PerformanceManager:
 
     def get_stats(self):
         avg = sum(self.cycle_times)/max(len(self.cycle_times),1)
-        return {"avg_cycle_time": f"{avg:.2f}s", "cache": self.candle_cache.stats()}
+        stats = {"avg_cycle_time": f"{avg:.2f}s", "cache": self.candle_store.stats()}
+        for name, cache in self.caches.items():
+            stats[name] = cache.stats()
+        return stats